@@ -0,0 +1,71 @@
+import importlib
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+from stream.language.completed.python import Cases, write_cases_to_file
+
+
+def make_cases(size: int, seed: int = 0) -> Cases:
+    # A large array, a matrix with about as many cells, and a string of the same length
+    rng = random.Random(seed)
+    side = int(size**0.5)
+    nums = [rng.randint(-(10**9), 10**9) for _ in range(size)]
+    grid = [[rng.randint(0, 1) for _ in range(side)] for _ in range(side)]
+    text = "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=size))
+    return [([nums, size // 2], 0), ([grid], 0), ([text], 0)]
+
+
+def load(name: str) -> float:
+    # A fresh import, as a worker does for every run
+    importlib.invalidate_caches()
+    start = time.perf_counter()
+    importlib.import_module(name)
+    seconds = time.perf_counter() - start
+    del sys.modules[name]
+    return seconds
+
+
+def load_traced(name: str) -> int:
+    # Tracing slows down the import, so the peak memory is measured apart from the time
+    tracemalloc.start()
+    try:
+        load(name)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def main():
+    # Artifacts are rewritten between runs, so workers never reuse cached bytecode
+    sys.dont_write_bytecode = True
+    directory = Path(tempfile.mkdtemp())
+    sys.path.insert(0, str(directory))
+
+    print(
+        f"{'size':>9} {'format':>8} {'write [ms]':>11} {'import [ms]':>12} {'peak [MiB]':>11}"
+    )
+    for size in (10_000, 100_000, 1_000_000):
+        cases = make_cases(size)
+        for cases_format in ("literal", "json"):
+            name = f"cases_{cases_format}_{size}"
+            start = time.perf_counter()
+            write_cases_to_file(
+                cases, directory / f"{name}.py", cases_format=cases_format
+            )
+            written = time.perf_counter() - start
+
+            seconds, peak = load(name), load_traced(name)
+            print(
+                f"{size:>9} {cases_format:>8} {written * 1e3:>11.1f} "
+                f"{seconds * 1e3:>12.1f} {peak / 2**20:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import ast
+import re
+import time
+
+from stream.dataset import (
+    get_dataset,
+    get_problem_description,
+    get_problem_descriptions,
+)
+
+
+def get_problem_description_legacy(full_text: str):
+    # The previous implementation, kept as a reference for results and timings
+    delimiter_pattern = r"Example \d{1}:|Constraints:"
+    parts = re.split(delimiter_pattern, full_text)
+    desc = parts[0].strip()
+
+    cases = []
+    for i in range(1, len(parts) - 1):
+        example = parts[i].strip()
+
+        pattern = r"Input:(.*?)Output:"
+        substrings = re.findall(pattern, example, re.DOTALL)
+        if len(substrings) != 1:
+            raise RuntimeError("Input extraction failed!")
+        case_inputs = substrings[0].strip()
+
+        case_inputs = list(case_inputs)
+        to_pop = []
+        for i, letter in enumerate(case_inputs):
+            if letter == "=":
+                to_pop.append(i)
+                for j in range(i - 1, -1, -1):
+                    if case_inputs[j] == ",":
+                        break
+                    to_pop.append(j)
+        for i in reversed(sorted(to_pop)):
+            case_inputs.pop(i)
+        case_inputs = f"[{''.join(case_inputs).strip()}]"
+        case_inputs = case_inputs.replace("\xa0", "")
+        try:
+            case_inputs = ast.literal_eval(case_inputs)
+        except (ValueError, SyntaxError):
+            raise RuntimeError("Input evaluation failed!")
+
+        if "Explanation:" not in example:
+            substrings = re.split("Output:", example)[1:]
+        else:
+            pattern = r"Output:(.*?)Explanation:"
+            substrings = re.findall(pattern, example, re.DOTALL)
+
+        if len(substrings) != 1:
+            raise RuntimeError("Output extraction failed!")
+
+        try:
+            case_outputs = ast.literal_eval(substrings[0].strip())
+        except (ValueError, SyntaxError):
+            raise RuntimeError("Output evaluation failed!")
+
+        cases.append((case_inputs, case_outputs))
+
+    return desc, cases
+
+
+def parse_all(parser, texts: list[str]) -> tuple[list, float]:
+    results = []
+    start = time.perf_counter()
+    for text in texts:
+        try:
+            results.append(parser(text))
+        except RuntimeError as e:
+            results.append(str(e))
+    return results, time.perf_counter() - start
+
+
+def main(args):
+    ds = get_dataset(args.name, split="train", columns=["problem_description"])
+    texts = ds["problem_description"]
+    print(f"Parsing {len(texts)} problems of {args.name}")
+
+    legacy, legacy_time = parse_all(get_problem_description_legacy, texts)
+    new, new_time = parse_all(get_problem_description, texts)
+    mismatches = [i for i, (a, b) in enumerate(zip(legacy, new)) if a != b]
+    failures = sum(isinstance(result, str) for result in new)
+    print(f"  legacy parser:  {legacy_time * 1e3:9.1f} ms")
+    print(f"  single pass:    {new_time * 1e3:9.1f} ms ({legacy_time / new_time:.1f}x)")
+    print(f"  failed to parse: {failures}, mismatches with legacy: {len(mismatches)}")
+    # The legacy parser mangles inputs with `=` inside values, e.g., `["a==b"]`
+    for i in mismatches[: args.show]:
+        print(f"    row {i}: legacy={legacy[i]!r:.80} new={new[i]!r:.80}")
+
+    start = time.perf_counter()
+    ds.map(
+        get_problem_descriptions,
+        batched=True,
+        num_proc=args.num_proc,
+        remove_columns=["problem_description"],
+        load_from_cache_file=False,
+    )
+    print(
+        f"  Dataset.map (batched, num_proc={args.num_proc}): {(time.perf_counter() - start) * 1e3:9.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--name", type=str, default="newfacade/LeetCodeDataset")
+    parser.add_argument("--num_proc", type=int, default=None)
+    parser.add_argument("--show", type=int, default=5, help="Mismatches to print")
+    main(parser.parse_args())
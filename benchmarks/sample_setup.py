@@ -0,0 +1,91 @@
+import time
+
+import dspy
+
+from stream.feedback import ModuleWithCodeFeedback, get_feedback_adapter
+from stream.language.completed.python import Project
+from stream.main import get_project_structure
+from stream.project import FileAdapter
+
+
+class ProblemSolving(dspy.Signature):
+    """You are an expert in solving algorithmic problems using Python."""
+
+    problem: str = dspy.InputField(desc="The description of the problem to be solved")
+    cases: dspy.Code["Python"] = dspy.InputField(desc="The paired inputs and outputs")
+    project: Project = dspy.InputField(desc=get_project_structure("./output", Project))
+
+    explanation: str = dspy.OutputField(desc="An explanation of the implementation")
+    solution: dspy.Code["Python"] = dspy.OutputField(
+        desc="Code that solves the problem"
+    )
+    runtime: dspy.Code["Python"] = dspy.OutputField(
+        desc="Code that profiles the runtime"
+    )
+    memory: dspy.Code["Python"] = dspy.OutputField(desc="Code that profiles the memory")
+    test: dspy.Code["Python"] = dspy.OutputField(desc="Code that tests the solution")
+
+
+def augment_legacy(signature: type[dspy.Signature]) -> type[dspy.Signature]:
+    # The previous per-module augmentation, repeated for every sample
+    for field_name, field in signature.output_fields.items():
+        if getattr(field.annotation, "__bases__", None) != (dspy.Code,):
+            continue
+        signature = signature.append(
+            f"{field_name}_attempts",
+            dspy.InputField(desc=f"The previous attempts for `{field_name}`"),
+            type_=list[dspy.Code[f"{field.annotation.language.lower()}"]],
+        )
+        signature = signature.append(
+            f"{field_name}_outcome",
+            dspy.InputField(
+                desc=f"Outcome of attempting to execute the latest of `{field_name}_attempts`"
+            ),
+            type_=str,
+        )
+    return signature
+
+
+def setup_legacy(i: int, steps: int) -> None:
+    # A signature per sample, an augmented copy per module, and an adapter class per step
+    project = get_project_structure(f"./output/sample{i}", Project)
+    signature = ProblemSolving.with_updated_fields(
+        "project", type_=Project, desc=project
+    )
+    augment_legacy(dspy.Predict(signature).signature)
+    for _ in range(steps):
+
+        class FeedbackWrapperAdapter(FileAdapter):
+            pass
+
+        FeedbackWrapperAdapter()
+
+
+def setup_shared(i: int, steps: int) -> None:
+    project = get_project_structure(f"./output/sample{i}", Project)
+    module = ModuleWithCodeFeedback(dspy.Predict(ProblemSolving), project)
+    for _ in range(steps):
+        get_feedback_adapter(FileAdapter)(FileAdapter(), module, None, {})
+
+
+def measure(fn, samples: int, steps: int) -> float:
+    start = time.perf_counter()
+    for i in range(samples):
+        fn(i, steps)
+    return (time.perf_counter() - start) / samples
+
+
+def main():
+    samples, steps = 200, 3
+    # Warm up the caches of the shared setup, which are paid once per run
+    setup_shared(0, steps)
+
+    legacy = measure(setup_legacy, samples, steps)
+    shared = measure(setup_shared, samples, steps)
+    print(f"Per-sample setup over {samples} samples with {steps} steps each")
+    print(f"  per-sample signatures: {legacy * 1e3:8.3f} ms")
+    print(f"  shared signatures:     {shared * 1e3:8.3f} ms ({legacy / shared:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
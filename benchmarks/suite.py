@@ -0,0 +1,221 @@
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+from typing import Callable
+
+import dspy
+
+from stream.dataset import get_problem_description
+from stream.language.completed.python import ExecutionLimits
+from stream.language.completed.python import Project
+from stream.language.completed.python import WarmExecutor
+from stream.language.completed.python import execute_code
+from stream.language.utils import validate_with_template
+from stream.main import get_project_structure
+from stream.project import FileAdapter, write_code
+
+from validator import MARKER, scale_template
+
+
+ROOT = Path(__file__).parents[1]
+BASELINE = ROOT / "benchmarks" / "baseline.json"
+
+# Every benchmark is a setup returning the function to time, or None to skip it. Resources
+# entered on the stack are released once the benchmark is measured
+type Benchmark = Callable[[contextlib.ExitStack], Callable[[], object] | None]
+
+
+def validator(copies: int) -> Benchmark:
+    def setup(stack: contextlib.ExitStack):
+        template, valid, _ = scale_template(copies)
+        return lambda: validate_with_template(template, valid, MARKER)
+
+    return setup
+
+
+def make_problem(examples: int, size: int) -> str:
+    # A problem in the format of the LeetCode dataset, with arrays of the given size
+    text = (
+        "Given an array `nums` and an integer `k`, return the k-th largest element.\n\n"
+    )
+    for i in range(examples):
+        nums = ",".join(str((i * 31 + j * 17) % 1000) for j in range(size))
+        text += (
+            f"Example {i + 1}:\nInput: nums = [{nums}], k = {i + 1}\nOutput: {i}\n\n"
+        )
+    return text + "Constraints:\n1 <= k <= nums.length <= 10^5"
+
+
+def problem_description(examples: int, size: int) -> Benchmark:
+    def setup(stack: contextlib.ExitStack):
+        texts = [make_problem(examples, size) for _ in range(20)]
+        return lambda: [get_problem_description(text) for text in texts]
+
+    return setup
+
+
+def execute(warm: bool) -> Benchmark:
+    def setup(stack: contextlib.ExitStack):
+        # Modules are resolved relative to the working directory, as in a run
+        os.chdir(tempfile.mkdtemp())
+        project = get_project_structure("proj", Project)
+        project.initialize_modules()
+        write_code("def solve(x):\n    return x", project.file_map["solution"])
+        write_code(
+            "from proj.solution import solve\nprint(solve(1))",
+            project.file_map["runtime"],
+        )
+
+        executor = stack.enter_context(WarmExecutor(workers=1)) if warm else None
+        limits = ExecutionLimits(timeout=60.0)
+
+        def run():
+            return execute_code(
+                project.file_map["runtime"],
+                project,
+                "ok",
+                executor=executor,
+                limits=limits,
+            )
+
+        # Spawning a fresh interpreter needs a working `uv` environment
+        if run() != "ok":
+            return None
+        return run
+
+    return setup
+
+
+def adapter_format(outputs: int) -> Benchmark:
+    def setup(stack: contextlib.ExitStack):
+        # A chain of code outputs, each depending on all of the previous ones
+        files = []
+        for i in range(outputs):
+            file = Project.File(Path(f"proj/output{i}"))
+            file.add_deps(files[:])
+            files.append(file)
+        project = Project(files=files)
+
+        fields = {
+            "problem": (str, dspy.InputField(desc="The problem")),
+            "project": (Project, dspy.InputField(desc=project)),
+        }
+        for i in range(outputs):
+            fields[f"output{i}"] = (
+                dspy.Code["python"],
+                dspy.OutputField(desc=f"Output {i}"),
+            )
+        signature = dspy.make_signature(fields, "Solve the problem.")
+
+        adapter = FileAdapter()
+        adapter.project = project
+        signature = signature.delete("project")
+        inputs = {"problem": make_problem(3, 100)}
+        return lambda: adapter.format(signature, [], inputs)
+
+    return setup
+
+
+def dependency_map(files: int) -> Benchmark:
+    def setup(stack: contextlib.ExitStack):
+        nodes = [Project.File(Path(f"proj/module{i}")) for i in range(files)]
+        for i, node in enumerate(nodes):
+            # Every module depends on a handful of earlier ones
+            node.add_deps([nodes[j] for j in range(max(i - 8, 0), i)])
+        return lambda: Project(files=nodes).dependency_map
+
+    return setup
+
+
+BENCHMARKS: dict[str, Benchmark] = {
+    **{f"validate_with_template[{c}]": validator(c) for c in (1, 4, 16, 64)},
+    **{
+        f"get_problem_description[{e}x{s}]": problem_description(e, s)
+        for e, s in ((3, 10), (3, 1000), (9, 1000))
+    },
+    "execute_code[cold]": execute(warm=False),
+    "execute_code[warm]": execute(warm=True),
+    **{f"FileAdapter.format[{n}]": adapter_format(n) for n in (5, 20)},
+    **{f"Project.dependency_map[{n}]": dependency_map(n) for n in (100, 10_000)},
+}
+
+
+def measure(fn: Callable[[], object], repeats: int, warmup: int) -> float:
+    # Median of the repeats, after discarding the warmup runs
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(args) -> int:
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    results, regressions = {}, []
+    cwd = os.getcwd()
+
+    print(f"{'benchmark':<36} {'median [ms]':>12} {'baseline [ms]':>14} {'ratio':>7}")
+    for name, setup in BENCHMARKS.items():
+        if args.filter and args.filter not in name:
+            continue
+        with contextlib.ExitStack() as stack:
+            stack.callback(os.chdir, cwd)
+            fn = setup(stack)
+            if fn is None:
+                print(f"{name:<36} {'skipped':>12}")
+                continue
+            results[name] = seconds = measure(fn, args.repeats, args.warmup)
+
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:<36} {seconds * 1e3:>12.3f} {'-':>14}")
+            continue
+        ratio = seconds / reference
+        flag = ""
+        if ratio > 1 + args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<36} {seconds * 1e3:>12.3f} {reference * 1e3:>14.3f} {ratio:>6.2f}x{flag}"
+        )
+
+    if args.save:
+        BASELINE.write_text(json.dumps({**baseline, **results}, indent=2) + "\n")
+        print(f"\nSaved {len(results)} results to {BASELINE.relative_to(ROOT)}")
+        return 0
+
+    if regressions:
+        print(
+            f"\n{len(regressions)} regressions beyond {args.threshold:.0%}: {', '.join(regressions)}"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--filter", type=str, default=None, help="Only run benchmarks containing this"
+    )
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Relative slowdown against the baseline that fails the suite",
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="Store the results as the new baseline"
+    )
+    sys.exit(main(parser.parse_args()))
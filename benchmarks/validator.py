@@ -0,0 +1,143 @@
+import difflib
+import importlib.util
+import time
+
+from pathlib import Path
+
+from stream.language.utils import validate_with_template
+
+
+ROOT = Path(__file__).parents[1]
+MARKER = "# TODO:"
+
+
+def validate_with_differ(
+    template: str | None, code: str, allowed_change: str
+) -> tuple[bool, str | None]:
+    # The previous implementation, kept as a reference for verdicts and timings
+    feedback = None
+    if template is None:
+        return True, feedback
+
+    template = template.replace("\\n", "\\\\n").replace("\\t", "\\\\t")
+    code = code.replace("\\n", "\\\\n").replace("\\t", "\\\\t")
+
+    d = difflib.Differ()
+    diffs = list(d.compare(template.splitlines(), code.splitlines()))
+    indents = [None for diff in diffs]
+    allowed = [False for diff in diffs]
+    valid = [False for diff in diffs]
+
+    indent_previous = 0
+    for i, diff in enumerate(diffs):
+        _, diff_code = diff[:2], diff[2:]
+        indent_current = (
+            indent_previous
+            if diff_code.strip() == ""
+            else len(diff_code) - len(diff_code.lstrip())
+        )
+        indent_previous = indents[i] = indent_current
+
+        if diff_code.strip().startswith(allowed_change):
+            allowed[i] = True
+
+    for i, diff in enumerate(diffs):
+        diff_type, diff_code = diff[:2], diff[2:]
+        indent_current = indents[i]
+
+        if allowed[i] or diff_type == "  ":
+            valid[i] = True
+
+        if diff_type in ["- ", "+ "]:
+            for j in range(i + 1, len(diffs)):
+                if indent_current == indents[j] and allowed[j]:
+                    valid[i] = True
+                if indent_current > indents[j]:
+                    break
+
+            for j in range(i - 1, -1, -1):
+                if indent_current == indents[j] and allowed[j]:
+                    valid[i] = True
+                if indent_current > indents[j]:
+                    break
+
+    if not all(valid):
+        feedback = f"You must strictly follow the provided template and \
+only modify the code where it is marked with {allowed_change}!"
+
+    return all(valid), feedback
+
+
+def load_fixtures() -> list[tuple[str, str, str]]:
+    # Re-use the (template, code) pairs of the unit tests
+    spec = importlib.util.spec_from_file_location(
+        "test_template", ROOT / "tests" / "test_template.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    def fixture(name: str) -> str:
+        return getattr(module, name).__wrapped__()
+
+    pairs = [
+        ("template", "valid"),
+        ("template", "invalid"),
+        ("template", "valid_newline"),
+        ("template_py", "valid_py"),
+    ]
+    return [(f"{code}", fixture(template), fixture(code)) for template, code in pairs]
+
+
+def scale_template(copies: int) -> tuple[str, str, str]:
+    # Grow the project management template, and complete or break its TODOs
+    template = (ROOT / "src/stream/language/template/pm.py").read_text()
+    template = "\n\n".join(
+        template.replace("Project", f"Project{i}") for i in range(copies)
+    )
+    valid = template.replace(
+        "        ...\n",
+        "        value = [item for item in range(10)]\n        return value\n",
+    )
+    invalid = f"{valid}\n\ndef added_fn():\n    return None\n"
+    return template, valid, invalid
+
+
+def measure(fn, *args, repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print("Verdicts on tests/test_template.py fixtures")
+    for name, template, code in load_fixtures():
+        new = validate_with_template(template, code, MARKER)
+        old = validate_with_differ(template, code, MARKER)
+        print(
+            f"  {name:<16} differ={old[0]!s:<6} opcodes={new[0]!s:<6} identical={new == old}"
+        )
+        assert new == old, f"Verdicts differ on {name}"
+
+    print("\nScaling on copies of template/pm.py (best of 3)")
+    print(
+        f"  {'copies':>6} {'lines':>7} {'differ [ms]':>12} {'opcodes [ms]':>13} {'speedup':>8}"
+    )
+    for copies in (1, 4, 16, 64):
+        template, valid, invalid = scale_template(copies)
+        for code in (valid, invalid):
+            assert validate_with_template(
+                template, code, MARKER
+            ) == validate_with_differ(template, code, MARKER)
+        old = measure(validate_with_differ, template, valid, MARKER)
+        new = measure(validate_with_template, template, valid, MARKER)
+        lines = len(valid.splitlines())
+        print(
+            f"  {copies:>6} {lines:>7} {old * 1e3:>12.2f} {new * 1e3:>13.2f} {old / new:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
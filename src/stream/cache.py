@@ -0,0 +1,66 @@
+import hashlib
+import os
+import threading
+import uuid
+
+from pathlib import Path
+
+
+class DiskCache:
+    # A directory of content-addressed entries, evicted in least-recently-used order
+    def __init__(self, directory: Path | str, max_entries: int = 10_000):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.entries = sum(1 for _ in self.directory.glob("*/*.json"))
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            # Length-prefix every part, so that different splits never collide
+            data = part.encode("utf-8")
+            digest.update(len(data).to_bytes(8, "little"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        path = self.path(key)
+        try:
+            value = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        # The modification time doubles as the last access time for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        path = self.path(key)
+        path.parent.mkdir(exist_ok=True)
+        exists = path.exists()
+
+        # Write atomically, so that concurrent readers never see partial entries
+        tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp.write_text(value, encoding="utf-8")
+        os.replace(tmp, path)
+
+        with self.lock:
+            self.entries += not exists
+            if self.entries > self.max_entries:
+                self.evict()
+
+    def evict(self) -> None:
+        # Make room for a tenth of the capacity at once, to amortize the directory scan
+        paths = sorted(self.directory.glob("*/*.json"), key=lambda p: p.stat().st_mtime)
+        excess = len(paths) - int(self.max_entries * 0.9)
+        for path in paths[: max(excess, 0)]:
+            path.unlink(missing_ok=True)
+        self.entries = len(paths) - max(excess, 0)
@@ -1,67 +1,78 @@
 import ast
+import json
+import random
 import re
-from datasets import load_dataset, Dataset
+from collections.abc import Container
+from datasets import load_dataset, Dataset, DatasetDict
 
 from stream.language.completed.python import Cases
 
 
-def get_dataset(name: str = "newfacade/LeetCodeDataset") -> Dataset:
-    ds = load_dataset(name)
+def get_dataset(
+    name: str = "newfacade/LeetCodeDataset",
+    split: str | None = None,
+    columns: list[str] | None = None,
+) -> Dataset | DatasetDict:
+    # Splits are memory-mapped from the Arrow cache, so rows are only read when indexed
+    ds = load_dataset(name, split=split)
+    if columns is not None:
+        ds = ds.select_columns(columns)
     return ds
 
 
+def get_sample_indices(
+    num_rows: int,
+    shard: int = 0,
+    num_shards: int = 1,
+    limit: int | None = None,
+    skip: Container[int] = (),
+) -> list[int]:
+    # Shuffle indices instead of rows, then deal them out so that shards are disjoint
+    indices = list(range(num_rows))
+    random.shuffle(indices)
+    indices = [i for i in indices[shard::num_shards] if i not in skip]
+    return indices[:limit]
+
+
+# Compiled once, since they are applied to every example of every problem
+DELIMITER_PATTERN = re.compile(r"Example \d{1}:|Constraints:")
+INPUT_PATTERN = re.compile(r"Input:(.*?)Output:", re.DOTALL)
+OUTPUT_PATTERN = re.compile(r"Output:(.*?)Explanation:", re.DOTALL)
+# A named assignment is an identifier followed by `=`, at the start or after a comma
+ASSIGNMENT_PATTERN = re.compile(r"(^|,)\s*[A-Za-z_]\w*\s*=(?!=)")
+NAME_PATTERN = re.compile(r"(?:^|,)\s*([A-Za-z_]\w*)\s*=(?!=)")
+
+
 def get_problem_description(
     full_text: str,
 ) -> tuple[str, Cases]:
     # Extract all text from beginning up to first occurence of 'Example'
-    delimiter_pattern = r"Example \d{1}:|Constraints:"
-    parts = re.split(delimiter_pattern, full_text)
+    parts = DELIMITER_PATTERN.split(full_text)
     desc = parts[0].strip()
 
     # Extract input-output from all examples
     cases: Cases = []
-    for i in range(1, len(parts) - 1):
-        example = parts[i].strip()
-        example.replace("null", "None")
+    for example in parts[1:-1]:
+        example = example.strip()
 
         # Extract inputs
-        start_str = "Input:"
-        end_str = "Output:"
-        pattern = rf"{start_str}(.*?){end_str}"
-        substrings = re.findall(pattern, example, re.DOTALL)
+        substrings = INPUT_PATTERN.findall(example)
         if len(substrings) != 1:
             raise RuntimeError("Input extraction failed!")
-        case_inputs = substrings[0].strip()
 
         # Delete all named assignments from inputs
-        case_inputs = list(case_inputs)
-        to_pop = []
-        for i, letter in enumerate(case_inputs):
-            # Pop from the left
-            if letter == "=":
-                to_pop.append(i)
-                for j in range(i - 1, -1, -1):
-                    if case_inputs[j] == ",":
-                        break
-                    to_pop.append(j)
-        for i in reversed(sorted(to_pop)):
-            case_inputs.pop(i)
-        case_inputs = f"[{''.join(case_inputs).strip()}]"
-        case_inputs = case_inputs.replace("\xa0", "")
+        case_inputs = ASSIGNMENT_PATTERN.sub(r"\1", substrings[0].strip())
+        case_inputs = f"[{case_inputs.strip()}]".replace("\xa0", "")
         try:
             case_inputs = ast.literal_eval(case_inputs)
         except (ValueError, SyntaxError) as e:
-            print(e)
-            raise RuntimeError("Input evaluation failed!")
+            raise RuntimeError("Input evaluation failed!") from e
 
         # Some examples may not have explanations
-        start_str = "Output:"
-        end_str = "Explanation:"
-        if end_str not in example:
-            substrings = re.split(start_str, example)[1:]
+        if "Explanation:" not in example:
+            substrings = example.split("Output:")[1:]
         else:
-            pattern = rf"{start_str}(.*?){end_str}"
-            substrings = re.findall(pattern, example, re.DOTALL)
+            substrings = OUTPUT_PATTERN.findall(example)
 
         if len(substrings) != 1:
             raise RuntimeError("Output extraction failed!")
@@ -69,9 +80,80 @@ def get_problem_description(
         try:
             case_outputs = ast.literal_eval(substrings[0].strip())
         except (ValueError, SyntaxError) as e:
-            print(e)
-            raise RuntimeError("Output evaluation failed!")
+            raise RuntimeError("Output evaluation failed!") from e
 
         cases.append((case_inputs, case_outputs))
 
     return desc, cases
+
+
+def parse_problem(full_text: str) -> tuple[str, Cases]:
+    if "Constraints:" not in full_text:
+        raise ValueError("Found a sample without 'Constraints:'!")
+
+    desc, cases = get_problem_description(full_text)
+
+    if "Example:" in desc:
+        raise ValueError("Examples should not be found in the problem description!")
+
+    return desc, cases
+
+
+def get_problem_constraints(full_text: str) -> tuple[list[str], str]:
+    # The names of the inputs, from the first example, and the text of the constraints
+    parts = DELIMITER_PATTERN.split(full_text)
+    names = []
+    if len(parts) > 2:
+        substrings = INPUT_PATTERN.findall(parts[1])
+        if substrings:
+            names = NAME_PATTERN.findall(substrings[0].strip())
+    constraints = parts[-1].strip() if "Constraints:" in full_text else ""
+    return names, constraints
+
+
+def get_problem_descriptions(batch: dict[str, list[str]]) -> dict[str, list]:
+    # Batched parsing for `Dataset.map(batched=True)`, recording failures instead of raising
+    columns = {
+        "description": [],
+        "cases": [],
+        "names": [],
+        "constraints": [],
+        "error": [],
+    }
+    for full_text in batch["problem_description"]:
+        desc, cases, names, constraints, error = None, None, None, None, None
+        try:
+            desc, cases = parse_problem(full_text)
+            # Cases are nested arrays of mixed types, which Arrow can only store as text
+            cases = json.dumps(cases)
+            names, constraints = get_problem_constraints(full_text)
+        except (RuntimeError, TypeError, ValueError) as e:
+            desc, cases, error = None, None, str(e)
+
+        columns["description"].append(desc)
+        columns["cases"].append(cases)
+        columns["names"].append(names)
+        columns["constraints"].append(constraints)
+        columns["error"].append(error)
+
+    return columns
+
+
+def get_problem(ds: Dataset, i: int) -> tuple[str, Cases]:
+    row = ds[i]
+    if "problem_description" in row:
+        return parse_problem(row["problem_description"])
+
+    # Rows of a preprocessed dataset are already parsed
+    if row["error"] is not None:
+        raise ValueError(row["error"])
+    return row["description"], [tuple(case) for case in json.loads(row["cases"])]
+
+
+def get_constraints(ds: Dataset, i: int) -> tuple[list[str], str]:
+    row = ds[i]
+    if "problem_description" in row:
+        return get_problem_constraints(row["problem_description"])
+
+    # Datasets preprocessed before the constraints were kept have neither column
+    return row.get("names") or [], row.get("constraints") or ""
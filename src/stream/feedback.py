@@ -1,14 +1,201 @@
+import contextvars
+import re
+import threading
+
 from collections import defaultdict
-from copy import deepcopy
-from typing import Any, Type
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from functools import cache
+from graphlib import TopologicalSorter
+from pathlib import Path
+from typing import Any, Callable, Type
 
 import dspy
 
+from stream.cache import DiskCache
+from stream.metrics import metrics
 from stream.project import write_code
+from stream.store import MemoryStore
+from stream.language.utils import truncate_middle
+from stream.language.utils import unified_diff
 from stream.language.utils import validate_with_template
 
 from stream.language.completed.python import Project
 from stream.language.completed.python import execute_code
+from stream.language.completed.python import get_fingerprint
+from stream.language.completed.python import measure_solution
+from stream.language.completed.python import ExecutionLimits
+from stream.language.completed.python import Measurement
+from stream.language.completed.python import WarmExecutor
+
+
+# Frames of the interpreter machinery, which say nothing about the generated code
+FROZEN_FRAME_PATTERN = re.compile(r'^\s*File "<frozen [^>]*>".*\n', re.MULTILINE)
+# Characters per token, to turn token budgets into lengths
+CHARS_PER_TOKEN = 4
+
+
+def compact_trajectory(
+    attempts: list[str], outcome: str, max_tokens: int | None = None
+) -> tuple[str, str]:
+    # The latest attempt in full, and earlier ones as diffs against it, newest first
+    outcome = FROZEN_FRAME_PATTERN.sub("", outcome)
+    if not attempts:
+        return "", outcome
+
+    budget = max_tokens * CHARS_PER_TOKEN if max_tokens is not None else None
+    if budget is not None:
+        # The outcome gets up to a quarter of the budget, and the attempts the rest
+        outcome = truncate_middle(outcome, budget // 4)
+        budget -= len(outcome)
+
+    latest = attempts[-1]
+    sections = [f"Latest attempt ({len(attempts)}):\n{latest}"]
+    if budget is not None:
+        sections[0] = truncate_middle(sections[0], budget)
+        budget -= len(sections[0])
+
+    for k in range(len(attempts) - 2, -1, -1):
+        diff = unified_diff(latest, attempts[k], "latest", f"attempt {k + 1}")
+        section = (
+            f"Attempt {k + 1}, as a diff against the latest:\n{diff or '(identical)'}"
+        )
+        if budget is not None and len(section) > budget:
+            sections.append(f"[... {k + 1} earlier attempts omitted ...]")
+            break
+        sections.append(section)
+        if budget is not None:
+            budget -= len(section)
+
+    return "\n\n".join(sections), outcome
+
+
+def get_performance_advice(
+    measurement: Measurement, best: Measurement | None = None
+) -> str:
+    # Turn the measurements of a passing solution into advice, as a judge reading the code would
+    lines = [
+        "The code is correct. Improve its performance without sacrificing correctness.",
+        measurement.describe(),
+    ]
+    if best is not None:
+        lines.append(measurement.compare(best))
+    return "\n".join(lines)
+
+
+def format_names(names: set[str]) -> str:
+    return ", ".join(f"`{name}`" for name in sorted(names))
+
+
+@cache
+def get_feedback_signature(
+    signature: Type[dspy.Signature], compact: bool = False
+) -> Type[dspy.Signature]:
+    # Built once per signature, and shared by the modules of all samples
+    mod_signature = signature
+    for field_name, info in signature.output_fields.items():
+        # Only for dspy.Code outputs
+        if getattr(info.annotation, "__bases__", None) != (dspy.Code,):
+            continue
+
+        # Insert the trajectory field containing all (possibly truncated) previous attempts
+        if compact:
+            mod_signature = mod_signature.append(
+                f"{field_name}_attempts",
+                dspy.InputField(
+                    desc=f"The latest attempt for `{field_name}`, followed by unified diffs from it to the earlier attempts"
+                ),
+                type_=str,
+            )
+        else:
+            mod_signature = mod_signature.append(
+                f"{field_name}_attempts",
+                dspy.InputField(desc=f"The previous attempts for `{field_name}`"),
+                type_=list[dspy.Code[f"{info.annotation.language.lower()}"]],
+            )
+
+        # Insert the code execution outcome from the latest attempt
+        mod_signature = mod_signature.append(
+            f"{field_name}_outcome",
+            dspy.InputField(
+                desc=f"Outcome of attempting to execute the latest of `{field_name}_attempts`"
+            ),
+            type_=str,
+        )
+
+    return mod_signature
+
+
+@cache
+def freeze_outputs(
+    signature: Type[dspy.Signature], names: tuple[str, ...]
+) -> Type[dspy.Signature]:
+    # Turn the outputs into inputs, and drop their trajectories
+    for name in names:
+        info = signature.output_fields[name]
+        signature = signature.delete(name).append(
+            name,
+            dspy.InputField(desc=f"The final `{name}`, kept from the previous attempt"),
+            type_=info.annotation,
+        )
+        for key in (f"{name}_attempts", f"{name}_outcome"):
+            if key in signature.input_fields:
+                signature = signature.delete(key)
+    return signature
+
+
+@cache
+def get_feedback_adapter(adapter_class: type[dspy.Adapter]) -> type[dspy.Adapter]:
+    # Subclass the adapter in use, so that it keeps its behavior (e.g., fallbacks)
+    class FeedbackWrapperAdapter(adapter_class):
+        def __init__(
+            self,
+            adapter: dspy.Adapter,
+            module: "ModuleWithCodeFeedback",
+            state: "FeedbackState",
+            frozen: dict[str, Any],
+        ):
+            super().__init__()
+            self.adapter = adapter
+            self.module = module
+            self.state = state
+            self.frozen = frozen
+
+        def __call__(
+            self, lm, lm_kwargs, signature, demos, inputs
+        ) -> list[dict[str, Any]]:
+            if self.state.advice is None:
+                return self.adapter(lm, lm_kwargs, signature, demos, inputs)
+
+            mod_signature = self.module.prepare(
+                signature, inputs, self.state, self.frozen
+            )
+            completions = self.adapter(lm, lm_kwargs, mod_signature, demos, inputs)
+            return [{**completion, **self.frozen} for completion in completions]
+
+    return FeedbackWrapperAdapter
+
+
+@dataclass
+class FeedbackState:
+    # The number of completed steps, with the feedback and trajectory they produced
+    step: int = 0
+    advice: dict[str, str] | None = None
+    attempts: defaultdict[str, list[str]] = field(
+        default_factory=lambda: defaultdict(list)
+    )
+    # The sources each advice was given for, including the transitive dependencies
+    fingerprints: dict[str, str] = field(default_factory=dict)
+    # The measured runtime and memory of the passing solution, by step
+    measurements: dict[int, dict[str, Any]] = field(default_factory=dict)
+    # While optimizing, the step with the fastest passing solution and the advice to improve it
+    best: int | None = None
+    performance: str | None = None
+
+    def success(self, success_message: str) -> bool:
+        return self.advice is not None and all(
+            message == success_message for message in self.advice.values()
+        )
 
 
 class ModuleWithCodeFeedback(dspy.Module):
@@ -22,6 +209,22 @@ class ModuleWithCodeFeedback(dspy.Module):
         template_changes: str | None = None,
         success_message: str = "Code executed successfully!",
         trajectory_len: int = 0,
+        executor: WarmExecutor | None = None,
+        limits: ExecutionLimits | None = None,
+        max_parallel: int | None = None,
+        cache: DiskCache | None = None,
+        on_step: Callable[[FeedbackState], None] | None = None,
+        regenerate_failing: bool = False,
+        compact: bool = False,
+        trajectory_tokens: int | None = None,
+        fail_fast: bool = False,
+        store: MemoryStore | None = None,
+        measure: str | None = None,
+        repeats: int = 7,
+        sizes: tuple[int, ...] = (),
+        scaled: dict[int, Path] | None = None,
+        optimize: bool = False,
+        min_improvement: float = 0.05,
     ):
         super().__init__()
 
@@ -41,109 +244,355 @@ class ModuleWithCodeFeedback(dspy.Module):
         self.template_changes = template_changes
         self.success_message = success_message
         self.trajectory_len = trajectory_len
+        self.executor = executor
+        self.limits = limits
+        self.max_parallel = max_parallel
+        self.cache = cache
+        self.on_step = on_step
+        self.regenerate_failing = regenerate_failing
+        # Send earlier attempts as diffs and shortened outcomes, within a budget per field
+        self.compact = compact
+        self.trajectory_tokens = trajectory_tokens
+        # Stop executing anything else in a step after the first failure
+        self.fail_fast = fail_fast
+        # Keep the project in memory instead of on disk, which requires a warm executor
+        self.store = store
+        # Benchmark this output on the cases whenever it passes
+        self.measure = measure
+        self.repeats = repeats
+        self.sizes = sizes
+        # Generated cases modules per size, instead of repeating the examples up to each size
+        self.scaled = scaled
+        # Keep regenerating the measured output while it gets faster by at least a fraction
+        self.optimize = optimize
+        self.min_improvement = min_improvement
 
         # Modify all signatures to include trajectories and code execution feedback
-        self.mod_signatures: dict[str, Type[dspy.Signature]] = {}
-        for name, signature in self.base_signatures.items():
-            mod_signature: Type[dspy.Signature] = deepcopy(signature)
-
-            for field_name, field in mod_signature.output_fields.items():
-                # Only for dspy.Code outputs
-                if getattr(field.annotation, "__bases__", None) != (dspy.Code,):
-                    continue
+        self.mod_signatures: dict[str, Type[dspy.Signature]] = {
+            name: get_feedback_signature(signature, compact)
+            for name, signature in self.base_signatures.items()
+        }
 
-                # Insert the trajectory field containing all (possibly truncated) previous attempts
-                mod_signature = mod_signature.append(
-                    f"{field_name}_attempts",
-                    dspy.InputField(desc=f"The previous attempts for `{field_name}`"),
-                    type_=list[dspy.Code[f"{field.annotation.language.lower()}"]],
+    def prepare(
+        self,
+        signature: Type[dspy.Signature],
+        inputs: dict[str, Any],
+        state: FeedbackState,
+        frozen: dict[str, Any],
+    ) -> Type[dspy.Signature]:
+        # Retrieve the modified signature based on the runtime module name
+        mod_signature = self.mod_signatures[self.base_names[signature]]
+        # Pass in trajectory and execution feedback
+        for key, value in state.advice.items():
+            # A passing solution that is being optimized gets its measurements instead
+            if (
+                key == self.measure
+                and state.performance
+                and value == self.success_message
+            ):
+                value = state.performance
+            if self.compact:
+                attempts, value = compact_trajectory(
+                    state.attempts[key], value, self.trajectory_tokens
                 )
+                inputs[f"{key}_attempts"] = attempts
+            else:
+                inputs[f"{key}_attempts"] = state.attempts[key]
+            inputs[f"{key}_outcome"] = value
 
-                # Insert the code execution outcome from the latest attempt
-                mod_signature = mod_signature.append(
-                    f"{field_name}_outcome",
-                    dspy.InputField(
-                        desc=f"Outcome of attempting to execute the latest of `{field_name}_attempts`"
-                    ),
-                    type_=str,
-                )
+        if not frozen:
+            return mod_signature
 
-            self.mod_signatures[name] = mod_signature
+        # Pass the frozen outputs as inputs, and only ask for the other outputs
+        mod_signature = freeze_outputs(mod_signature, tuple(frozen))
+        for name, value in frozen.items():
+            inputs.pop(f"{name}_attempts", None)
+            inputs.pop(f"{name}_outcome", None)
+            inputs[name] = value
+        return mod_signature
 
-    def forward(self, **kwargs):
+    def forward(self, state: FeedbackState | None = None, **kwargs):
         adapter = dspy.settings.adapter or dspy.ChatAdapter()
-        mod_signatures = self.mod_signatures
-        base_names = self.base_names
+        wrapper_class = get_feedback_adapter(type(adapter))
 
-        # TODO: dataclass this
-        advice: dict[str, str] | None = None
-        attempts: dict[str, list[str]] | None = None
+        # Start from scratch, or resume from the state after a number of steps
+        state = state or FeedbackState()
+        outputs = dspy.Prediction()
+        # Outputs that passed and are kept as they are, instead of being regenerated
+        frozen: dict[str, Any] = {}
+        # The outputs and advice of the fastest passing step, while optimizing
+        best: tuple[dspy.Prediction, dict[str, str]] | None = None
 
         # For each attempt
-        for i in range(self.steps):
-            all_success = True
-
-            class FeedbackWrapperAdapter(adapter.__class__):
-                def __call__(
-                    self, lm, lm_kwargs, signature, demos, inputs
-                ) -> list[dict[str, Any]]:
-                    if advice is None:
-                        return adapter(lm, lm_kwargs, signature, demos, inputs)
-
-                    # Retrieve the modified signature based on the runtime module name
-                    mod_signature = mod_signatures[base_names[signature]]
-                    # Pass in trajectory and execution feedback
-                    for key, value in advice.items():
-                        inputs[f"{key}_attempts"] = attempts[key]
-                        inputs[f"{key}_outcome"] = value
-
-                    return adapter(lm, lm_kwargs, mod_signature, demos, inputs)
-
-            with dspy.context(adapter=FeedbackWrapperAdapter()):
+        for i in range(state.step, self.steps):
+            with (
+                metrics.tags(step=i),
+                metrics.span("feedback.generate"),
+                dspy.context(adapter=wrapper_class(adapter, self, state, frozen)),
+            ):
                 outputs = self.base_module(**kwargs)
 
-            advice = dict()
-            if attempts is None:
-                attempts = defaultdict(list)
-
-            for name, field in outputs.items():
-                # For code outputs only
-                if type(field).__base__ != dspy.Code:
+            # For code outputs only
+            names = [
+                name
+                for name, field in outputs.items()
+                if type(field).__base__ == dspy.Code
+            ]
+            for name in names:
+                if name in frozen:
                     continue
-
                 # Write the code to disk
-                artifact_path = self.project.file_map[name]
-                write_code(
-                    outputs[name].code,
-                    artifact_path,
-                    extra=self.test_code.get(name) if self.test_code else None,
-                )
+                with (
+                    metrics.tags(step=i),
+                    metrics.span("feedback.write_code", output=name),
+                ):
+                    self.write_output(name, outputs[name].code)
                 # Store attempt and truncate trajectory
-                attempts[name].append(field.code)
-                if self.trajectory_len > 0 and i >= self.trajectory_len:
-                    attempts[name].pop(0)
+                state.attempts[name].append(outputs[name].code)
+                if (
+                    self.trajectory_len > 0
+                    and len(state.attempts[name]) > self.trajectory_len
+                ):
+                    state.attempts[name].pop(0)
 
-                # Validate the code against the template
-                valid, feedback = validate_with_template(
-                    self.template_changes, outputs[name].code, self.allowed_changes
-                )
-                if not valid:
-                    all_success = False
-                    advice[name] = feedback
-                else:
-                    # Attempt to execute the code
-                    message = execute_code(
-                        artifact_path,
-                        project=self.project,
-                        success_message=self.success_message,
+            with metrics.tags(step=i), metrics.span("feedback.check"):
+                state.advice = self.check_outputs(outputs, names, state)
+            metrics.count(
+                "feedback.failures",
+                sum(
+                    message != self.success_message for message in state.advice.values()
+                ),
+                step=i,
+            )
+
+            # Benchmark the passing solution, so that the steps can be compared
+            if (
+                self.measure is not None
+                and state.advice.get(self.measure) == self.success_message
+            ):
+                with (
+                    metrics.tags(step=i),
+                    metrics.span("feedback.measure", output=self.measure),
+                ):
+                    _, measurement = measure_solution(
+                        self.project,
+                        self.measure,
+                        executor=self.executor,
+                        limits=self.limits,
+                        store=self.store,
+                        repeats=self.repeats,
+                        sizes=self.sizes,
+                        scaled=self.scaled,
                     )
-                    if message != self.success_message:
-                        all_success = False
-                    advice[name] = message
+                if measurement is not None:
+                    state.measurements[i] = asdict(measurement)
+                else:
+                    metrics.count("feedback.unmeasured", output=self.measure, step=i)
+
+            # Keep going while the passing solution gets faster, with its measurements as advice
+            optimizing = (
+                self.optimize
+                and state.success(self.success_message)
+                and self.improved(state, i)
+            )
+            if optimizing:
+                best = outputs, dict(state.advice)
+
+            state.step = i + 1
+            if self.on_step is not None:
+                self.on_step(state)
 
             # Early exit on all success
-            if all_success:
-                return outputs
+            if state.success(self.success_message) and not optimizing:
+                return self.restore(best, outputs, state)
+
+            if self.regenerate_failing:
+                # Only code is kept, as prose (e.g., an explanation) describes all of it
+                frozen = {
+                    name: outputs[name]
+                    for name in names
+                    if state.advice.get(name) == self.success_message
+                    and not (optimizing and name == self.measure)
+                }
 
         # If we reach this, the LLM failed to generate code that executes for all outputs
-        return outputs
+        return self.restore(best, outputs, state)
+
+    def write_output(self, name: str, code: str) -> None:
+        write_code(
+            code,
+            self.project.file_map[name],
+            extra=self.test_code.get(name) if self.test_code else None,
+            store=self.store,
+        )
+
+    def finished(self, state: FeedbackState) -> bool:
+        # Whether `forward` stopped after the recorded steps, as when resuming a sample
+        if state.step >= self.steps:
+            return True
+        if not state.success(self.success_message):
+            return False
+        # A passing step that was the fastest so far is followed by another one
+        return not (self.optimize and state.best == state.step - 1)
+
+    def improved(self, state: FeedbackState, step: int) -> bool:
+        # Whether the step is the first measured one, or faster than the best one by enough
+        if step not in state.measurements:
+            return False
+        current = Measurement(**state.measurements[step])
+        best = None
+        if state.best is not None and state.best in state.measurements:
+            best = Measurement(**state.measurements[state.best])
+            # A step that errors or times out at the larger sizes is not faster
+            if len(current.sizes) < len(best.sizes):
+                return False
+            size = current.common_size(best)
+            if current.cost_at(size) > best.cost_at(size) * (1 - self.min_improvement):
+                return False
+        state.best = step
+        state.performance = get_performance_advice(current, best)
+        return True
+
+    def restore(
+        self,
+        best: tuple[dspy.Prediction, dict[str, str]] | None,
+        outputs: dspy.Prediction,
+        state: FeedbackState,
+    ) -> dspy.Prediction:
+        # Fall back to the fastest passing outputs, if later steps were slower or failed
+        if best is None or best[0] is outputs:
+            return outputs
+        best_outputs, state.advice = best
+        for name, value in best_outputs.items():
+            if type(value).__base__ == dspy.Code:
+                self.write_output(name, value.code)
+        state.performance = None
+        return best_outputs
+
+    def check_output(self, name: str, code: str) -> str:
+        # Validate the code against the template
+        with metrics.span("feedback.validate", output=name):
+            valid, feedback = validate_with_template(
+                self.template_changes, code, self.allowed_changes
+            )
+        if not valid:
+            return feedback
+
+        # Attempt to execute the code
+        with metrics.span("feedback.execute", output=name):
+            return execute_code(
+                self.project.file_map[name],
+                project=self.project,
+                success_message=self.success_message,
+                executor=self.executor,
+                limits=self.limits,
+                cache=self.cache,
+                store=self.store,
+            )
+
+    def check_outputs(
+        self,
+        outputs: dspy.Prediction,
+        names: list[str],
+        state: FeedbackState | None = None,
+    ) -> dict[str, str]:
+        state = state or FeedbackState()
+        previous, fingerprints = state.advice or {}, state.fingerprints
+
+        # Only dependencies that are generated in this step have to be checked first
+        graph = {
+            name: self.project.dependency_graph[name] & set(names) for name in names
+        }
+        sorter = TopologicalSorter(graph)
+        sorter.prepare()
+
+        advice: dict[str, str] = {}
+        # The artifacts that failed or were not executed, with the root causes
+        failed: dict[str, set[str]] = {}
+        pending: dict[Future, str] = {}
+        # Set by the first failure, so that queued checks do not start in fail-fast mode
+        stop = threading.Event()
+        # Named before `stop` is set, as the checks it stops may finish before the failure
+        first_failure: list[str] = []
+        lock = threading.Lock()
+
+        def fail(name: str) -> None:
+            with lock:
+                if not first_failure:
+                    first_failure.append(name)
+            stop.set()
+
+        def check(name: str, code: str) -> str | None:
+            if stop.is_set():
+                return None
+            result = self.check_output(name, code)
+            if self.fail_fast and result != self.success_message:
+                fail(name)
+            return result
+
+        # Independent artifacts are checked concurrently, as soon as their dependencies pass
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            while sorter.is_active():
+                for name in sorter.get_ready():
+                    # Running on top of broken dependencies cannot succeed
+                    causes = set().union(
+                        *(failed[dep] for dep in graph[name] & failed.keys())
+                    )
+                    if causes:
+                        advice[name] = (
+                            f"Not executed, because it is blocked by {format_names(causes)}, "
+                            "which failed."
+                        )
+                    elif self.fail_fast and failed:
+                        causes = set().union(*failed.values())
+                        advice[name] = (
+                            f"Not executed, because {format_names(causes)} failed first."
+                        )
+                    if causes:
+                        failed[name] = causes
+                        fingerprints.pop(name, None)
+                        metrics.count("feedback.blocked", output=name)
+                        sorter.done(name)
+                        continue
+
+                    # Unchanged sources and dependencies lead to the same outcome as before
+                    fingerprint = get_fingerprint(
+                        self.project.file_map[name], self.project, self.store
+                    )
+                    if name in previous and fingerprints.get(name) == fingerprint:
+                        advice[name] = previous[name]
+                        if advice[name] != self.success_message:
+                            failed[name] = {name}
+                            if self.fail_fast:
+                                fail(name)
+                        metrics.count("feedback.reused", output=name)
+                        sorter.done(name)
+                        continue
+                    fingerprints[name] = fingerprint
+
+                    # Keep the sample and step tags of the caller in the worker thread
+                    context = contextvars.copy_context()
+                    future = pool.submit(context.run, check, name, outputs[name].code)
+                    pending[future] = name
+
+                if not pending:
+                    continue
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    result = future.result()
+                    if result is None:
+                        causes = set(first_failure)
+                        advice[name] = (
+                            f"Not executed, because {format_names(causes)} failed first."
+                        )
+                        failed[name] = causes
+                        fingerprints.pop(name, None)
+                    else:
+                        advice[name] = result
+                        if result != self.success_message:
+                            failed[name] = {name}
+                    sorter.done(name)
+
+        return advice
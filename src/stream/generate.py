@@ -0,0 +1,401 @@
+import ast
+import math
+import operator
+import random
+import re
+import string
+
+from dataclasses import dataclass, field
+
+from stream.language.completed.python import Cases, NestedArray
+
+# A subject of a constraint, such as `nums.length`, `nums[i]`, `grid[i].length` or `n`
+SUBJECT_PATTERN = re.compile(r"^([A-Za-z_]\w*)((?:\s*\[\s*\w+\s*\])*)(\.length)?$")
+COMPARISON_PATTERN = re.compile(r"(<=|>=|==|<|>)")
+# Bullets of listed constraints, but not the sign of a leading negative number
+BULLET_PATTERN = re.compile(r"^\s*(?:[*•]|-(?!\s*\d))\s*")
+CONSISTS_PATTERN = re.compile(
+    r"`?([A-Za-z_]\w*)(?:\[i\])?`? consists? (?:of|only of) (.*)"
+)
+# Characters named by the constraints, most specific first
+CHARSETS = (
+    ("lowercase and uppercase", string.ascii_letters),
+    ("lowercase english letters", string.ascii_lowercase),
+    ("uppercase english letters", string.ascii_uppercase),
+    ("english letters", string.ascii_letters),
+    ("digits", string.digits),
+)
+OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Pow: operator.pow,
+}
+
+# Subjects are keyed by input name, depth of indexing, and whether they are a length or a value
+type Key = tuple[str, int, str]
+
+
+@dataclass
+class Bounds:
+    lo: float | None = None
+    hi: float | None = None
+    # A length that bounds the value from above, such as `k <= nums.length`
+    hi_ref: Key | None = None
+
+
+@dataclass
+class Constraints:
+    bounds: dict[Key, Bounds] = field(default_factory=dict)
+    # Subjects that are equal to each other, such as `n == grid.length`
+    aliases: dict[Key, Key] = field(default_factory=dict)
+    charsets: dict[str, str] = field(default_factory=dict)
+    distinct: set[str] = field(default_factory=set)
+    sorted: set[str] = field(default_factory=set)
+
+    def get(self, key: Key) -> Bounds:
+        bounds = self.bounds.get(key)
+        alias = self.aliases.get(key)
+        if bounds is None and alias is not None:
+            bounds = self.bounds.get(alias)
+        return bounds or Bounds()
+
+
+def evaluate(text: str) -> float | None:
+    # Numbers as the constraints write them, such as `10^5`, `5 * 10^4` or `2^31 - 1`
+    text = text.replace("^", "**").replace("×", "*").replace(" ", "")
+    try:
+        node = ast.parse(text, mode="eval").body
+    except SyntaxError:
+        return None
+
+    def visit(node: ast.expr) -> float:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -visit(node.operand)
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            return OPERATORS[type(node.op)](visit(node.left), visit(node.right))
+        raise ValueError(ast.dump(node))
+
+    try:
+        return visit(node)
+    except (ValueError, OverflowError):
+        return None
+
+
+def parse_subject(text: str) -> Key | None:
+    match = SUBJECT_PATTERN.match(text.strip())
+    if match is None:
+        return None
+    name, indices, length = match.groups()
+    return name, indices.count("["), "length" if length else "value"
+
+
+def parse_constraints(text: str, names: list[str]) -> Constraints:
+    constraints = Constraints()
+    for line in (
+        text.replace("`", "").replace("≤", "<=").replace("≥", ">=").splitlines()
+    ):
+        line = BULLET_PATTERN.sub("", line).strip(" .,;\t")
+        lowered = line.lower()
+
+        match = CONSISTS_PATTERN.search(line)
+        if match is not None:
+            for phrase, charset in CHARSETS:
+                if phrase in match.group(2).lower():
+                    constraints.charsets[match.group(1)] = charset
+                    break
+
+        mentioned = [name for name in names if re.search(rf"\b{name}\b", line)]
+        if "unique" in lowered or "distinct" in lowered:
+            constraints.distinct.update(mentioned)
+        if "sorted" in lowered:
+            constraints.sorted.update(mentioned)
+
+        # A chain of comparisons, of numbers and of comma-separated subjects
+        parts = [part.strip() for part in COMPARISON_PATTERN.split(line)]
+        for left, op, right in zip(parts[0::2], parts[1::2], parts[2::2]):
+            if op in (">=", ">"):
+                left, right = right, left
+                op = op.replace(">", "<")
+            apply_comparison(constraints, left, op, right)
+    return constraints
+
+
+def apply_comparison(constraints: Constraints, left: str, op: str, right: str) -> None:
+    subjects = [parse_subject(part) for part in left.split(",")]
+    value = evaluate(right)
+    if all(subjects) and value is not None:
+        # An upper bound of the subjects on the left, with `<` excluding it for integers
+        for key in subjects:
+            bounds = constraints.bounds.setdefault(key, Bounds())
+            bounds.hi = value - 1 if op == "<" else value
+            if op == "==":
+                bounds.lo = value
+        return
+
+    subjects = [parse_subject(part) for part in right.split(",")]
+    value = evaluate(left)
+    if all(subjects) and value is not None:
+        for key in subjects:
+            bounds = constraints.bounds.setdefault(key, Bounds())
+            bounds.lo = value + 1 if op == "<" else value
+            if op == "==":
+                bounds.hi = value
+        return
+
+    # Comparisons between subjects, which relate a value to a length
+    left_key, right_key = parse_subject(left), parse_subject(right)
+    if left_key is None or right_key is None:
+        return
+    if op == "==":
+        constraints.aliases[left_key] = right_key
+        constraints.aliases[right_key] = left_key
+    else:
+        constraints.bounds.setdefault(left_key, Bounds()).hi_ref = right_key
+
+
+def flatten(value: NestedArray) -> list:
+    if isinstance(value, list):
+        return [item for element in value for item in flatten(element)]
+    return [value]
+
+
+def get_range(
+    key: Key, examples: list, constraints: Constraints
+) -> tuple[float, float]:
+    # The stated range of the values, or the range of the examples
+    bounds = constraints.get(key)
+    numbers = [value for value in examples if isinstance(value, (int, float))]
+    lo = bounds.lo if bounds.lo is not None else min(numbers, default=0)
+    hi = bounds.hi if bounds.hi is not None else max(numbers, default=lo)
+    return lo, max(lo, hi)
+
+
+def clip_length(key: Key, length: int, constraints: Constraints) -> int:
+    bounds = constraints.get(key)
+    if bounds.hi is not None:
+        length = min(length, int(bounds.hi))
+    if bounds.lo is not None:
+        length = max(length, int(bounds.lo))
+    return max(length, 0)
+
+
+class Generator:
+    # Inputs shaped like the examples, with the ranges and lengths stated by the constraints
+    def __init__(
+        self, cases: Cases, names: list[str], constraints: Constraints, seed: int = 0
+    ):
+        self.cases = cases
+        self.constraints = constraints
+        self.seed = seed
+
+        arity = len(cases[0][0])
+        # Without the names of the inputs, only the examples shape them
+        self.names = (
+            names if len(names) == arity else [f"input{i}" for i in range(arity)]
+        )
+        self.examples = {
+            name: [inputs[i] for inputs, _ in cases if i < len(inputs)]
+            for i, name in enumerate(self.names)
+        }
+        self.sequences = [
+            name
+            for name, values in self.examples.items()
+            if isinstance(values[0], (list, str))
+        ]
+
+    def width(self, name: str, inner: list[NestedArray]) -> int | None:
+        # Rows of pairs or triples keep their width, while matrices are about square
+        if not inner or not all(isinstance(value, list) for value in inner):
+            return None
+        lengths = {len(value) for value in inner}
+        bounds = self.constraints.get((name, 1, "length"))
+        if bounds.lo is not None and bounds.lo == bounds.hi:
+            return int(bounds.lo)
+        if bounds.hi is None and len(lengths) == 1 and max(lengths) < 4:
+            return max(lengths)
+        return None
+
+    def max_size(self) -> int | None:
+        # The largest stated size of a sequence input, or value of a scalar input without any
+        limits = []
+        for name in self.sequences or self.names:
+            kind = "length" if self.sequences else "value"
+            hi = self.constraints.get((name, 0, kind)).hi
+            if hi is None:
+                continue
+            if name in self.sequences:
+                inner = [
+                    value for sequence in self.examples[name] for value in sequence
+                ]
+                matrix = inner and all(isinstance(value, list) for value in inner)
+                if matrix and self.width(name, inner) is None:
+                    # The size of a matrix is the number of its cells
+                    hi *= self.constraints.get((name, 1, "length")).hi or hi
+            limits.append(int(hi))
+        return max(limits, default=None)
+
+    def sizes(self, sizes: tuple[int, ...]) -> list[int]:
+        # The requested sizes, up to the stated limit, which is measured as well
+        max_size = self.max_size()
+        if max_size is None:
+            return sorted(set(sizes))
+        return sorted({min(size, max_size) for size in sizes})
+
+    def generate(self, size: int) -> list[NestedArray]:
+        rng = random.Random(f"{self.seed}-{size}")
+        inputs = {}
+        for name in self.sequences:
+            inputs[name] = self.sequence(name, 0, self.examples[name], size, rng)
+        for name in self.names:
+            if name not in inputs:
+                inputs[name] = self.scalar(name, self.examples[name], size, inputs)
+        return [inputs[name] for name in self.names]
+
+    def scalar(
+        self,
+        name: str,
+        values: list[NestedArray],
+        size: int,
+        inputs: dict[str, NestedArray],
+    ) -> NestedArray:
+        key = (name, 0, "value")
+        value = values[-1]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return value
+
+        # A scalar that is the length of another input, such as `n == nums.length`
+        alias = self.constraints.aliases.get(key)
+        if alias is not None and alias[2] == "length" and alias[0] in inputs:
+            return len(get_at_depth(inputs[alias[0]], alias[1]))
+
+        bounds = self.constraints.get(key)
+        lo, hi = get_range(key, values, self.constraints)
+        if bounds.hi_ref is not None and bounds.hi_ref[0] in inputs:
+            hi = min(hi, len(get_at_depth(inputs[bounds.hi_ref[0]], bounds.hi_ref[1])))
+        if hi < lo:
+            # Such as `5 <= k <= nums.length` with a shorter `nums`, which no value satisfies
+            raise ValueError(f"No value of `{name}` is within [{lo}, {hi}]")
+        # Without sequences, the scalar is the size of the problem, such as `n`
+        if not self.sequences and isinstance(value, int):
+            value = size
+        return type(value)(min(max(value, lo), hi))
+
+    def sequence(
+        self,
+        name: str,
+        depth: int,
+        values: list[NestedArray],
+        size: int,
+        rng: random.Random,
+    ) -> NestedArray:
+        length_key = (name, depth, "length")
+        if isinstance(values[0], str):
+            charset = self.constraints.charsets.get(name) or "".join(
+                sorted(set("".join(values)))
+            )
+            if depth == 0:
+                length = clip_length(length_key, size, self.constraints)
+            else:
+                length = rng.randint(*self.element_lengths(length_key, values))
+            return "".join(rng.choices(charset or string.ascii_lowercase, k=length))
+
+        inner = [value for sequence in values for value in sequence]
+        if depth == 0:
+            length = clip_length(length_key, size, self.constraints)
+            if inner and all(isinstance(value, list) for value in inner):
+                width = self.width(name, inner)
+                if width is None:
+                    side = math.isqrt(size)
+                    width = clip_length((name, 1, "length"), side, self.constraints)
+                    length = clip_length(length_key, side, self.constraints)
+                    return [
+                        self.sequence_of(name, 1, inner, width, rng)
+                        for _ in range(length)
+                    ]
+                rows = [
+                    self.sequence_of(name, 1, inner, width, rng) for _ in range(length)
+                ]
+                # Constraints on the elements of rows, such as `starti <= endi`, are not
+                # parsed, so rows keep the order their elements have in the examples
+                if is_sorted_rows(inner):
+                    for row in rows:
+                        row.sort()
+                return rows
+        else:
+            length = rng.randint(*self.element_lengths(length_key, values))
+
+        return self.sequence_of(name, depth, values, length, rng)
+
+    def sequence_of(
+        self,
+        name: str,
+        depth: int,
+        values: list[NestedArray],
+        length: int,
+        rng: random.Random,
+    ) -> list[NestedArray]:
+        # Elements of sequences of the given length, one level below `depth`
+        inner = [value for sequence in values for value in sequence]
+        if inner and isinstance(inner[0], (list, str)):
+            return [
+                self.sequence(name, depth + 1, inner, length, rng)
+                for _ in range(length)
+            ]
+
+        key = (name, depth + 1, "value")
+        if inner and isinstance(inner[0], bool):
+            return [rng.random() < 0.5 for _ in range(length)]
+        lo, hi = get_range(key, flatten(values), self.constraints)
+        if inner and isinstance(inner[0], float):
+            elements = [rng.uniform(lo, hi) for _ in range(length)]
+        elif name in self.constraints.distinct and hi - lo + 1 >= length:
+            elements = rng.sample(range(int(lo), int(hi) + 1), length)
+        else:
+            elements = [rng.randint(int(lo), int(hi)) for _ in range(length)]
+
+        examples_sorted = all(
+            isinstance(value, list) and value == sorted(value) for value in values
+        ) and any(len(value) > 2 for value in values)
+        if name in self.constraints.sorted or (depth == 0 and examples_sorted):
+            elements.sort()
+        return elements
+
+    def element_lengths(self, key: Key, values: list[NestedArray]) -> tuple[int, int]:
+        # Inner sequences keep about the lengths of the examples
+        lengths = [len(value) for value in values]
+        lo = clip_length(key, min(lengths), self.constraints)
+        hi = clip_length(key, max(lengths), self.constraints)
+        return lo, max(lo, hi)
+
+
+def is_sorted_rows(rows: list[NestedArray]) -> bool:
+    # Rows of numbers, which are all in order, with more than one to tell it from chance
+    numbers = all(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        for row in rows
+        for value in row
+    )
+    return numbers and len(rows) > 1 and all(row == sorted(row) for row in rows)
+
+
+def get_at_depth(value: NestedArray, depth: int) -> NestedArray:
+    for _ in range(depth):
+        value = value[0]
+    return value
+
+
+def generate_cases(
+    cases: Cases,
+    names: list[str],
+    constraints: str,
+    sizes: tuple[int, ...],
+    seed: int = 0,
+) -> dict[int, Cases]:
+    # One generated case per size, whose expected output is unknown
+    if not cases:
+        return {}
+    generator = Generator(cases, names, parse_constraints(constraints, names), seed)
+    return {size: [(generator.generate(size), None)] for size in generator.sizes(sizes)}
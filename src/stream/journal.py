@@ -0,0 +1,100 @@
+import json
+import threading
+
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+from stream.feedback import FeedbackState
+
+
+@dataclass
+class Progress:
+    # The last recorded state of a sample, and whether it was finished
+    state: FeedbackState
+    done: bool = False
+
+
+class Journal:
+    # An append-only log of per-sample progress, so that interrupted runs can resume
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def append(self, record: dict) -> None:
+        line = json.dumps(record) + "\n"
+        # One write per record, flushed right away, so that a crash loses at most one line
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+
+    def step(self, sample: int, state: FeedbackState, seconds: float) -> None:
+        self.append(
+            {
+                "sample": sample,
+                "event": "step",
+                "step": state.step,
+                "advice": state.advice,
+                "attempts": state.attempts,
+                "fingerprints": state.fingerprints,
+                "measurements": state.measurements,
+                "best": state.best,
+                "performance": state.performance,
+                "seconds": seconds,
+            }
+        )
+
+    def done(
+        self, sample: int, state: FeedbackState, success: bool, seconds: float
+    ) -> None:
+        self.append(
+            {
+                "sample": sample,
+                "event": "done",
+                "step": state.step,
+                "success": success,
+                "seconds": seconds,
+            }
+        )
+
+    def load(self) -> dict[int, Progress]:
+        progress = {}
+        if not self.path.exists():
+            return progress
+
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A partial last line from an interrupted write
+                    continue
+
+                sample = record["sample"]
+                if record["event"] == "step":
+                    state = FeedbackState(
+                        step=record["step"],
+                        advice=record["advice"],
+                        attempts=defaultdict(list, record["attempts"]),
+                        fingerprints=record.get("fingerprints", {}),
+                        # JSON object keys are strings, while steps are numbers
+                        measurements={
+                            int(step): measurement
+                            for step, measurement in record.get(
+                                "measurements", {}
+                            ).items()
+                        },
+                        best=record.get("best"),
+                        performance=record.get("performance"),
+                    )
+                    progress[sample] = Progress(state)
+                elif record["event"] == "done":
+                    previous = progress.get(sample)
+                    state = (
+                        previous.state
+                        if previous
+                        else FeedbackState(step=record["step"])
+                    )
+                    progress[sample] = Progress(state, done=True)
+        return progress
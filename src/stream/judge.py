@@ -1,13 +1,36 @@
-import os
+import argparse
 import sys
 import dspy
 
-lm = dspy.LM(
-    model="openrouter/nvidia/nemotron-3-nano-30b-a3b:free",
-    api_key=os.environ["OPENROUTER_API_KEY"],
-    temperature=1.0,
-    cache=False,
+from stream.lm import get_lm
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--lm_cache",
+    type=str,
+    default=None,
+    help="Directory caching LM responses (disabled if not set)",
+)
+parser.add_argument(
+    "--lm_cache_size",
+    type=int,
+    default=10_000,
+    help="Maximum number of cached LM responses",
+)
+parser.add_argument(
+    "--replay",
+    action="store_true",
+    help="Serve every LM request from `--lm_cache`, failing on requests of a different run",
 )
+parser.add_argument(
+    "--fake_lm",
+    type=str,
+    default=None,
+    help="JSON spec of a local stand-in LM (see `stream.lm.FakeLM`), instead of calling the provider",
+)
+args = parser.parse_args()
+
+lm = get_lm(args.lm_cache, args.lm_cache_size, args.replay, args.fake_lm)
 dspy.configure(
     lm=lm,
 )
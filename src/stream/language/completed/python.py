@@ -1,19 +1,63 @@
+import codecs
+import contextlib
+import copy
+import importlib
+import importlib.abc
+import importlib.machinery
+import inspect
+import io
+import json
+import linecache
+import math
 import os
+import queue
+import runpy
+import signal
+import statistics
 import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import traceback
 
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from functools import cached_property
 from pathlib import Path
-from typing import Self
+from typing import IO, Any, Callable, Literal, Self
+
+from stream.cache import DiskCache
+from stream.metrics import metrics
+from stream.store import MemoryStore
+
+try:
+    import resource
+except ImportError:
+    # Resource limits are only available on POSIX systems
+    resource = None
 
 type Scalar = str | int | float | bool | None
 type NestedArray = Scalar | list[NestedArray]
 type Cases = list[tuple[NestedArray[Scalar], NestedArray[Scalar]]]
+# Cases as a Python literal, or as JSON data next to a module that loads it
+type CasesFormat = Literal["literal", "json"]
+
+CASES_DATA_SUFFIX = ".json"
+# Reads the data through the loader of the module, so cases kept in memory load as well
+JSON_CASES_LOADER = """import json
+
+{name} = [
+    tuple(case)
+    for case in json.loads(__loader__.get_data(__file__.removesuffix(".py") + "{suffix}"))
+]
+"""
 
 
 @dataclass
 class Project:
     files: list[File] = field(default_factory=list)
+    cases_format: CasesFormat = "literal"
 
     @dataclass
     class File:
@@ -45,6 +89,11 @@ class Project:
         mapping = {f.path.stem: f.path.with_suffix(self.suffix) for f in self.files}
         return mapping
 
+    @cached_property
+    def dependency_graph(self) -> dict[str, set[str]]:
+        graph = {f.path.stem: {g.path.stem for g in f.depends_on} for f in self.files}
+        return graph
+
 
 def generate_use_statement(location: Path):
     parts = list(location.parts)
@@ -52,26 +101,1025 @@ def generate_use_statement(location: Path):
     return f"from {'.'.join(parts)} import <function-or-variable-name>"
 
 
+# Standard library modules commonly used by generated code, imported once per worker
+PRELOAD_MODULES = (
+    "bisect",
+    "collections",
+    "functools",
+    "heapq",
+    "itertools",
+    "math",
+    "time",
+    "tracemalloc",
+    "typing",
+)
+
+type Status = Literal["success", "error", "timeout", "cpu", "oom", "killed"]
+
+
+@dataclass
+class ExecutionLimits:
+    # Wall-clock seconds, CPU seconds, address space bytes, and kept characters per stream
+    timeout: float | None = None
+    cpu_seconds: int | None = None
+    memory_bytes: int | None = None
+    max_output: int | None = None
+
+
+@dataclass
+class Outcome:
+    status: Status
+    returncode: int | None = None
+    stdout: str = ""
+    stderr: str = ""
+    limits: ExecutionLimits = field(default_factory=ExecutionLimits)
+
+    def describe(self) -> str:
+        # Turn the outcome into advice for the LLM, instead of only the raw stderr
+        match self.status:
+            case "success":
+                message = "Execution succeeded."
+            case "timeout":
+                message = (
+                    f"Execution timed out after {self.limits.timeout} seconds. "
+                    "Make sure the code terminates and does not wait for input."
+                )
+            case "cpu":
+                message = (
+                    f"Execution exceeded the CPU time limit of {self.limits.cpu_seconds} seconds. "
+                    "Use a more efficient algorithm."
+                )
+            case "oom":
+                message = "Execution ran out of memory"
+                if self.limits.memory_bytes is not None:
+                    message += f" (limit of {self.limits.memory_bytes // 2**20} MiB)"
+                message += ". Reduce the memory usage of the code."
+            case "killed":
+                signum = get_signal(self.returncode)
+                message = f"Execution was killed by {signal.Signals(signum).name}."
+            case _:
+                message = f"Execution failed with exit code {self.returncode}."
+
+        if self.stderr:
+            message += f"\nstderr:\n{self.stderr}"
+        return message
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, data: str) -> Self:
+        fields = json.loads(data)
+        fields["limits"] = ExecutionLimits(**fields["limits"])
+        return cls(**fields)
+
+
+def get_signal(returncode: int) -> int | None:
+    # Killed by a signal, either directly or as reported by `uv run` (128 + signal)
+    if returncode < 0:
+        return -returncode
+    if returncode - 128 in signal.valid_signals():
+        return returncode - 128
+    return None
+
+
+def get_status(returncode: int, stderr: str) -> Status:
+    if returncode == 0:
+        return "success"
+    signum = get_signal(returncode)
+    if signum is not None:
+        return "cpu" if signum == getattr(signal, "SIGXCPU", None) else "killed"
+    if "MemoryError" in stderr.rstrip().rpartition("\n")[-1]:
+        return "oom"
+    return "error"
+
+
+def apply_limits(limits: ExecutionLimits) -> dict[int, tuple[int, int]]:
+    # Only soft limits are lowered, so a warm worker can restore them after a run
+    previous = {}
+    if resource is None:
+        return previous
+    if limits.cpu_seconds is not None:
+        # The CPU limit is cumulative, so offset it by what the process already used
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = math.ceil(usage.ru_utime + usage.ru_stime)
+        previous[resource.RLIMIT_CPU] = resource.getrlimit(resource.RLIMIT_CPU)
+        hard = previous[resource.RLIMIT_CPU][1]
+        resource.setrlimit(resource.RLIMIT_CPU, (used + limits.cpu_seconds, hard))
+    if limits.memory_bytes is not None:
+        previous[resource.RLIMIT_AS] = resource.getrlimit(resource.RLIMIT_AS)
+        hard = previous[resource.RLIMIT_AS][1]
+        resource.setrlimit(resource.RLIMIT_AS, (limits.memory_bytes, hard))
+    return previous
+
+
+def restore_limits(previous: dict[int, tuple[int, int]]) -> None:
+    for limit, value in previous.items():
+        resource.setrlimit(limit, value)
+
+
+class CappedIO(io.StringIO):
+    # Keeps the first `max_output` characters and drops the rest without buffering them
+    def __init__(self, max_output: int | None):
+        super().__init__()
+        self.max_output = max_output
+        self.size = 0
+
+    def write(self, s: str) -> int:
+        if self.max_output is None:
+            return super().write(s)
+        room = self.max_output - self.size
+        if room > 0:
+            super().write(s[:room])
+        self.size += len(s)
+        return len(s)
+
+    def getvalue(self) -> str:
+        text = super().getvalue()
+        if self.max_output is None or self.size <= self.max_output:
+            return text
+        return f"{text}\n[... truncated {self.size - self.max_output} characters]"
+
+
+def get_module_name(path: Path) -> str:
+    parts = list(path.parts)
+    parts[-1] = path.stem
+    return ".".join(parts)
+
+
+def get_files(store: MemoryStore, paths: list[Path]) -> dict[str, str]:
+    # Only the modules a run imports, with the data of the cases stored as data
+    files = {}
+    for path in paths:
+        for file in (path, path.with_suffix(CASES_DATA_SUFFIX)):
+            text = store.read(file)
+            if text is not None:
+                files[file.as_posix()] = text
+    return files
+
+
+class MemoryFinder(importlib.abc.MetaPathFinder, importlib.abc.InspectLoader):
+    # Serves modules from files in memory, and their parent packages as empty ones
+    def __init__(self, files: dict[str, str]):
+        self.files = files
+        self.modules = {
+            get_module_name(Path(filename)): (filename, source)
+            for filename, source in files.items()
+            if filename.endswith(".py")
+        }
+        self.packages = {
+            name.rpartition(".")[0] for name in self.modules if "." in name
+        }
+        for package in list(self.packages):
+            while "." in package:
+                package = package.rpartition(".")[0]
+                self.packages.add(package)
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname in self.modules:
+            spec = importlib.machinery.ModuleSpec(
+                fullname, self, origin=self.modules[fullname][0]
+            )
+            spec.has_location = True
+            return spec
+        if fullname in self.packages:
+            return importlib.machinery.ModuleSpec(fullname, self, is_package=True)
+        return None
+
+    def is_package(self, fullname: str) -> bool:
+        return fullname in self.packages
+
+    def get_source(self, fullname: str) -> str:
+        return self.modules[fullname][1] if fullname in self.modules else ""
+
+    def get_data(self, path: str) -> bytes:
+        # Data next to the modules, such as cases stored apart from their loader
+        filename = Path(path).as_posix()
+        if filename not in self.files:
+            raise FileNotFoundError(path)
+        return self.files[filename].encode("utf-8")
+
+    def get_code(self, fullname: str):
+        if fullname not in self.modules:
+            return compile("", f"<package {fullname}>", "exec")
+        filename, source = self.modules[fullname]
+        # Let tracebacks show the lines of the artifacts, as for files on disk
+        linecache.cache[filename] = (
+            len(source),
+            None,
+            source.splitlines(True),
+            filename,
+        )
+        return compile(source, filename, "exec", dont_inherit=True)
+
+    def close(self) -> None:
+        for filename, _ in self.modules.values():
+            linecache.cache.pop(filename, None)
+
+
+def run_module(module_name: str, max_output: int | None = None) -> tuple[int, str, str]:
+    # Run a module as `__main__` inside the current interpreter, capturing its output
+    stdout, stderr = CappedIO(max_output), CappedIO(max_output)
+    modules = set(sys.modules)
+    argv, path = sys.argv, list(sys.path)
+    # Artifacts are rewritten between runs, so never trust the cached directory listings
+    importlib.invalidate_caches()
+
+    returncode = 0
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            runpy.run_module(module_name, run_name="__main__", alter_sys=True)
+        except SystemExit as e:
+            # Mimic the interpreter's handling of `sys.exit`
+            if e.code is None or isinstance(e.code, int):
+                returncode = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                returncode = 1
+        except BaseException as e:
+            # Hide this frame, so the traceback looks like the one of `python -m`
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            returncode = 1
+
+    # Drop every module imported by the artifact, so the next run starts fresh
+    for name in set(sys.modules) - modules:
+        del sys.modules[name]
+    sys.argv, sys.path[:] = argv, path
+
+    return returncode, stdout.getvalue(), stderr.getvalue()
+
+
+def serve_worker(preload: list[str]) -> None:
+    # Reserve the original pipes for the protocol, artifacts only see the captured streams
+    requests = os.fdopen(os.dup(sys.stdin.fileno()), "r", encoding="utf-8")
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()):
+        os.dup2(devnull, fd)
+    sys.stdin = io.StringIO()
+    # Artifacts may be rewritten within the timestamp resolution of a cached bytecode file
+    sys.dont_write_bytecode = True
+
+    for name in preload:
+        importlib.import_module(name)
+
+    for line in requests:
+        request = json.loads(line)
+        limits = ExecutionLimits(**request["limits"])
+
+        # Projects kept in memory are imported from the request, instead of from disk
+        finder = None
+        if request.get("files"):
+            finder = MemoryFinder(request["files"])
+            sys.meta_path.insert(0, finder)
+
+        previous = apply_limits(limits)
+        try:
+            returncode, stdout, stderr = run_module(
+                request["module"], limits.max_output
+            )
+        finally:
+            restore_limits(previous)
+            if finder is not None:
+                sys.meta_path.remove(finder)
+                finder.close()
+
+        response = {"returncode": returncode, "stdout": stdout, "stderr": stderr}
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+
+class WarmWorker:
+    def __init__(self, preload: tuple[str, ...] = PRELOAD_MODULES):
+        self.runs = 0
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", __spec__.name, *preload],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+        )
+
+    def run(
+        self,
+        module_name: str,
+        limits: ExecutionLimits,
+        files: dict[str, str] | None = None,
+    ) -> Outcome:
+        self.runs += 1
+        request = {"module": module_name, "limits": asdict(limits), "files": files}
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+
+        # Wait for the response in a thread, so that the wall-clock limit can be enforced
+        lines: list[str] = []
+        reader = threading.Thread(
+            target=lambda: lines.append(self.process.stdout.readline()), daemon=True
+        )
+        reader.start()
+        reader.join(limits.timeout)
+        if reader.is_alive():
+            self.close()
+            reader.join()
+            return Outcome("timeout", limits=limits)
+
+        if not lines[0]:
+            # The artifact took the interpreter down with it (e.g., `os._exit` or a signal)
+            returncode = self.process.wait()
+            stderr = f"Executor worker exited with code {returncode}"
+            return Outcome(
+                get_status(returncode, stderr), returncode, "", stderr, limits
+            )
+
+        response = json.loads(lines[0])
+        returncode, stderr = response["returncode"], response["stderr"]
+        return Outcome(
+            get_status(returncode, stderr),
+            returncode,
+            response["stdout"],
+            stderr,
+            limits,
+        )
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def close(self) -> None:
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+        # A worker that died early leaves the unsent part of a request in the buffer
+        with contextlib.suppress(BrokenPipeError):
+            self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class WarmExecutor:
+    # A pool of long-lived interpreters that run artifacts without paying for startup
+    def __init__(
+        self,
+        workers: int = 1,
+        max_runs: int = 100,
+        preload: tuple[str, ...] = PRELOAD_MODULES,
+    ):
+        self.max_runs = max_runs
+        self.preload = preload
+        self.idle: queue.Queue[WarmWorker] = queue.Queue()
+        for _ in range(workers):
+            self.idle.put(WarmWorker(preload))
+
+    def run(
+        self,
+        module_name: str,
+        limits: ExecutionLimits,
+        files: dict[str, str] | None = None,
+    ) -> Outcome:
+        worker = self.idle.get()
+        try:
+            outcome = worker.run(module_name, limits, files)
+        except OSError as e:
+            outcome = Outcome("error", 1, "", str(e), limits)
+
+        # Recycle workers that crashed, ran out of memory, or whose global state may have drifted
+        if not worker.alive or outcome.status == "oom" or worker.runs >= self.max_runs:
+            worker.close()
+            worker = WarmWorker(self.preload)
+        self.idle.put(worker)
+
+        return outcome
+
+    def close(self) -> None:
+        while not self.idle.empty():
+            self.idle.get().close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_stream(stream: IO[bytes], output: CappedIO) -> None:
+    # Keep draining the pipe past the cap, so the process never blocks on a full pipe
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while chunk := stream.read1(2**16):
+        output.write(decoder.decode(chunk))
+    output.write(decoder.decode(b"", final=True))
+
+
+# Lowers the soft limits in the child, before running the module as `python -m` would
+LIMITED_MODULE_SOURCE = """\
+import resource, runpy
+for limit, soft in {limits!r}:
+    resource.setrlimit(limit, (soft, resource.getrlimit(limit)[1]))
+runpy.run_module({module!r}, run_name="__main__", alter_sys=True)
+"""
+
+
+def get_module_command(
+    interpreter: list[str], module_name: str, limits: ExecutionLimits
+) -> list[str]:
+    # `preexec_fn` is unsafe in a process with threads, so the child applies the limits itself
+    rlimits = []
+    if resource is not None and limits.cpu_seconds is not None:
+        rlimits.append((resource.RLIMIT_CPU, limits.cpu_seconds))
+    if resource is not None and limits.memory_bytes is not None:
+        rlimits.append((resource.RLIMIT_AS, limits.memory_bytes))
+    if not rlimits:
+        return [*interpreter, "-m", module_name]
+    source = LIMITED_MODULE_SOURCE.format(limits=rlimits, module=module_name)
+    return [*interpreter, "-c", source]
+
+
+def run_command(command: list[str], limits: ExecutionLimits) -> Outcome:
+    # A new session lets a timeout kill `uv` together with the interpreter it spawned
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=os.name == "posix",
+    )
+    outputs = (CappedIO(limits.max_output), CappedIO(limits.max_output))
+    readers = [
+        threading.Thread(target=read_stream, args=(stream, output), daemon=True)
+        for stream, output in zip((process.stdout, process.stderr), outputs)
+    ]
+    for reader in readers:
+        reader.start()
+
+    try:
+        returncode = process.wait(timeout=limits.timeout)
+    except subprocess.TimeoutExpired:
+        with contextlib.suppress(ProcessLookupError):
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        returncode = None
+        process.wait()
+
+    for reader in readers:
+        reader.join()
+    process.stdout.close()
+    process.stderr.close()
+    stdout, stderr = (output.getvalue() for output in outputs)
+
+    if returncode is None:
+        return Outcome("timeout", None, stdout, stderr, limits)
+    return Outcome(get_status(returncode, stderr), returncode, stdout, stderr, limits)
+
+
+def run_artifact(
+    artifact_path: Path,
+    executor: WarmExecutor | None = None,
+    limits: ExecutionLimits | None = None,
+    files: dict[str, str] | None = None,
+) -> Outcome:
+    limits = limits or ExecutionLimits()
+
+    # The artifact is a module
+    module_name = get_module_name(artifact_path)
+
+    if executor is not None:
+        return executor.run(module_name, limits, files)
+    if files is not None:
+        raise ValueError("Executing projects kept in memory requires a warm executor")
+    return run_command(
+        get_module_command(["uv", "run", "python"], module_name, limits), limits
+    )
+
+
+def read_artifact(path: Path, store: MemoryStore | None = None) -> str | None:
+    if store is not None:
+        return store.read(path)
+    return path.read_text(encoding="utf-8") if path.exists() else None
+
+
+def get_dependencies(artifact_path: Path, project: Project) -> set[str]:
+    # The transitive dependencies, since any of them can change the outcome
+    names, stack = set(), [artifact_path.stem]
+    while stack:
+        for dep in project.dependency_graph[stack.pop()] - names:
+            names.add(dep)
+            stack.append(dep)
+    return names
+
+
+def get_fingerprint(
+    artifact_path: Path, project: Project, store: MemoryStore | None = None
+) -> str:
+    names = get_dependencies(artifact_path, project)
+    sources = [read_artifact(artifact_path, store) or ""]
+    for name in sorted(names):
+        path = project.file_map[name]
+        # Cases stored as data only change the data, and not their loader
+        data = read_artifact(path.with_suffix(CASES_DATA_SUFFIX), store)
+        sources += [name, read_artifact(path, store) or "", data or ""]
+    return DiskCache.key("sources", *sources)
+
+
+def get_cache_key(
+    artifact_path: Path,
+    project: Project,
+    limits: ExecutionLimits,
+    store: MemoryStore | None = None,
+) -> str:
+    # Outputs and tracebacks refer to the location of the artifact, so it is part of the key
+    return DiskCache.key(
+        "execution",
+        sys.version,
+        sys.executable,
+        artifact_path.as_posix(),
+        json.dumps(asdict(limits)),
+        get_fingerprint(artifact_path, project, store),
+    )
+
+
+# Outcomes that do not depend on the load of the machine, and can be cached
+CACHED_STATUSES = ("success", "error", "oom")
+
+
 def execute_code(
     artifact_path: Path,
     project: Project,
     success_message: str,
+    executor: WarmExecutor | None = None,
+    limits: ExecutionLimits | None = None,
+    cache: DiskCache | None = None,
+    store: MemoryStore | None = None,
 ) -> str:
-    # The artifact is a module
-    parts = list(artifact_path.parts)
-    parts[-1] = artifact_path.stem
-    module_name = f"{'.'.join(parts)}"
-    command = f"uv run -m {module_name}"
-
-    # Execute the command
-    result = subprocess.run(command, capture_output=True)
-    if result.returncode == 0:
+    limits = limits or ExecutionLimits()
+
+    key, cached = None, None
+    if cache is not None:
+        key = get_cache_key(artifact_path, project, limits, store)
+        cached = cache.get(key)
+
+    if cached is not None:
+        outcome = Outcome.from_json(cached)
+        metrics.count("execute.cache_hit")
+    else:
+        with metrics.span("execute.run", warm=executor is not None):
+            files = None
+            if store is not None:
+                deps = get_dependencies(artifact_path, project)
+                paths = [artifact_path, *(project.file_map[dep] for dep in deps)]
+                files = get_files(store, paths)
+            outcome = run_artifact(artifact_path, executor, limits, files)
+        if key is not None and outcome.status in CACHED_STATUSES:
+            cache.set(key, outcome.to_json())
+    metrics.count(f"execute.{outcome.status}")
+
+    if outcome.status == "success":
         return success_message
 
-    return result.stderr
+    return outcome.describe()
+
+
+# The module written next to the solution to measure it
+HARNESS_NAME = "harness"
+
+
+@dataclass
+class Measurement:
+    # Per case, in the order of the cases: nanoseconds per call and peak traced bytes
+    median_ns: list[int]
+    iqr_ns: list[int]
+    peak_bytes: list[int]
+    # The peak resident memory of the whole process, if the platform reports it. Only for
+    # cold runs, as a warm worker keeps the high-water mark of all the artifacts it ran
+    max_rss_bytes: int | None = None
+    repeats: int = 0
+    # Per size of the scaled cases: summed nanoseconds per call and the largest peak bytes
+    sizes: list[int] = field(default_factory=list)
+    scaled_ns: list[int] = field(default_factory=list)
+    scaled_bytes: list[int] = field(default_factory=list)
+
+    @property
+    def total_ns(self) -> int:
+        return sum(self.median_ns)
+
+    @property
+    def total_bytes(self) -> int:
+        return max(self.peak_bytes, default=0)
+
+    def common_size(self, other: Self) -> int | None:
+        # Scaling stops early on errors and slow sizes, so only sizes measured for both compare
+        return max(set(self.sizes) & set(other.sizes), default=None)
+
+    def cost_at(self, size: int | None) -> int:
+        # The runtime at a scaled size, which tells algorithms apart better than the examples
+        if size not in self.sizes:
+            return self.total_ns
+        return self.scaled_ns[self.sizes.index(size)]
+
+    def peak_at(self, size: int | None) -> int:
+        if size not in self.sizes:
+            return self.total_bytes
+        return self.scaled_bytes[self.sizes.index(size)]
+
+    def describe_scaling(self) -> str:
+        lines = []
+        for size, ns, peak in zip(self.sizes, self.scaled_ns, self.scaled_bytes):
+            lines.append(f"  size {size}: {format_ns(ns)}, {format_bytes(peak)}")
+        if len(self.sizes) > 1:
+            lines.append(
+                f"Runtime grows as about n^{fit_exponent(self.sizes, self.scaled_ns):.2f}, "
+                f"and memory as about n^{fit_exponent(self.sizes, self.scaled_bytes):.2f}."
+            )
+        if lines:
+            lines.insert(0, "On inputs scaled to larger sizes:")
+        return "\n".join(lines)
+
+    def describe(self) -> str:
+        lines = [
+            f"Measured over {self.repeats} runs per case (median ± IQR, peak traced memory):"
+        ]
+        for i, (median, iqr, peak) in enumerate(
+            zip(self.median_ns, self.iqr_ns, self.peak_bytes)
+        ):
+            lines.append(
+                f"  case {i}: {format_ns(median)} ± {format_ns(iqr)}, {format_bytes(peak)}"
+            )
+        if self.max_rss_bytes is not None:
+            lines.append(f"Peak resident memory: {format_bytes(self.max_rss_bytes)}")
+        if self.sizes:
+            lines.append(self.describe_scaling())
+        return "\n".join(lines)
+
+    def compare(self, previous: Self) -> str:
+        # Relative change of the runtime and the largest peak memory
+        lines = []
+        size = self.common_size(previous)
+        for label, before, after, fmt in (
+            ("Runtime", previous.cost_at(size), self.cost_at(size), format_ns),
+            ("Peak memory", previous.peak_at(size), self.peak_at(size), format_bytes),
+        ):
+            if before == 0 or after == 0:
+                continue
+            ratio = before / after
+            if abs(ratio - 1) < 0.01:
+                change = "about the same"
+            elif ratio > 1:
+                change = f"{ratio:.2f}x lower"
+            else:
+                change = f"{1 / ratio:.2f}x higher"
+            lines.append(f"{label} went from {fmt(before)} to {fmt(after)} ({change}).")
+        return "\n".join(lines)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, data: str) -> Self:
+        return cls(**json.loads(data))
+
+
+def fit_exponent(sizes: list[int], values: list[float]) -> float:
+    # Least-squares slope in log-log space, where n^k is a line of slope k
+    points = [
+        (math.log(n), math.log(v)) for n, v in zip(sizes, values) if n > 0 and v > 0
+    ]
+    if len(points) < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+
+def format_ns(value: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("µs", 1e3)):
+        if value >= scale:
+            return f"{value / scale:.3g} {unit}"
+    return f"{value:.0f} ns"
+
+
+def format_bytes(value: float) -> str:
+    for unit, scale in (("GiB", 2**30), ("MiB", 2**20), ("KiB", 2**10)):
+        if value >= scale:
+            return f"{value / scale:.3g} {unit}"
+    return f"{value:.0f} B"
+
 
+def find_entry_point(module: Any, arity: int) -> Callable:
+    # LeetCode-style solutions are methods of `Solution`, others are top-level functions
+    solution = getattr(module, "Solution", None)
+    if isinstance(solution, type):
+        methods = [
+            name
+            for name, value in vars(solution).items()
+            if callable(value) and not name.startswith("_")
+        ]
+        if len(methods) == 1:
+            return getattr(solution(), methods[0])
 
-def write_cases_to_file(array: Cases, filename_with_ext: Path) -> None:
+    candidates = []
+    for name, value in vars(module).items():
+        # Only functions defined by the solution itself, not the ones it imported
+        if name.startswith("_") or not inspect.isfunction(value):
+            continue
+        if value.__module__ != module.__name__:
+            continue
+        required = [
+            p
+            for p in inspect.signature(value).parameters.values()
+            if p.default is p.empty and p.kind <= p.POSITIONAL_OR_KEYWORD
+        ]
+        if len(required) == arity:
+            candidates.append(value)
+    if len(candidates) != 1:
+        names = ", ".join(f"`{f.__name__}`" for f in candidates) or "none"
+        raise LookupError(
+            f"Expected a single function taking {arity} inputs to measure, found {names}"
+        )
+    return candidates[0]
+
+
+def measure_calls(
+    fn: Callable, cases: Cases, repeats: int = 7, warmup: int = 1
+) -> Measurement:
+    median_ns, iqr_ns, peak_bytes = [], [], []
+    for inputs, _ in cases:
+        # Inputs are copied outside of the timed region, since solutions may mutate them
+        for _ in range(warmup):
+            fn(*copy.deepcopy(inputs))
+
+        times = []
+        for _ in range(repeats):
+            args = copy.deepcopy(inputs)
+            start = time.perf_counter_ns()
+            fn(*args)
+            times.append(time.perf_counter_ns() - start)
+        median_ns.append(int(statistics.median(times)))
+        if len(times) > 1:
+            q1, _, q3 = statistics.quantiles(times, n=4)
+            iqr_ns.append(int(q3 - q1))
+        else:
+            iqr_ns.append(0)
+
+        # Tracing slows down the calls, so memory is measured separately from time
+        args = copy.deepcopy(inputs)
+        tracemalloc.start()
+        try:
+            baseline, _ = tracemalloc.get_traced_memory()
+            fn(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_bytes.append(peak - baseline)
+
+    return Measurement(median_ns, iqr_ns, peak_bytes, repeats=repeats)
+
+
+def get_max_rss() -> int | None:
+    if resource is None:
+        return None
+    # Reported in kilobytes on Linux, and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def scale_input(value: NestedArray, size: int) -> NestedArray:
+    # Repeat the elements of sequences up to the size, and keep scalars as they are
+    if isinstance(value, (list, str)) and value:
+        return (value * math.ceil(size / len(value)))[:size]
+    return value
+
+
+def scale_cases(cases: Cases, size: int) -> Cases:
+    # The expected outputs are unknown for scaled inputs
+    return [
+        ([scale_input(value, size) for value in inputs], None) for inputs, _ in cases
+    ]
+
+
+# Larger sizes are skipped once a size would take longer than this per call
+MAX_SCALED_NS = 10**9
+# Calls traced for memory are slower, and are counted as this many timed calls
+TRACED_CALL_COST = 4
+# The growth assumed from a single measured size, which errs on the side of stopping
+DEFAULT_EXPONENT = 2.0
+# The share of the timeout spent measuring, leaving a margin for the interpreter startup
+MEASURE_BUDGET = 0.8
+
+
+def load_cases(module_name: str) -> Cases:
+    # Cases modules hold a single variable, named after the module
+    return getattr(
+        importlib.import_module(module_name), module_name.rpartition(".")[-1]
+    )
+
+
+def estimate_scaled_ns(measurement: Measurement, size: int) -> int | None:
+    # The runtime per call at a size, extrapolated from the sizes measured so far
+    if not measurement.sizes:
+        return None
+    exponent = DEFAULT_EXPONENT
+    if len(measurement.sizes) > 1:
+        exponent = fit_exponent(measurement.sizes, measurement.scaled_ns)
+    ratio = size / measurement.sizes[-1]
+    return int(measurement.scaled_ns[-1] * ratio ** max(exponent, 1.0))
+
+
+def measure_scaling(
+    measurement: Measurement,
+    fn: Callable,
+    load: Callable[[int], Cases],
+    sizes: tuple[int, ...],
+    repeats: int,
+    deadline_ns: int | None = None,
+    on_size: Callable[[], None] | None = None,
+) -> None:
+    for size in sizes:
+        # Stop before a size that would run too long, rather than lose all sizes to a timeout
+        estimate = estimate_scaled_ns(measurement, size)
+        if estimate is not None:
+            if estimate > MAX_SCALED_NS:
+                break
+            total = estimate * (repeats + TRACED_CALL_COST)
+            if deadline_ns is not None and time.perf_counter_ns() + total > deadline_ns:
+                break
+        try:
+            scaled = measure_calls(fn, load(size), repeats, warmup=0)
+        except Exception:
+            # Inputs may break the preconditions of the problem at some size
+            break
+        measurement.sizes.append(size)
+        measurement.scaled_ns.append(scaled.total_ns)
+        measurement.scaled_bytes.append(scaled.total_bytes)
+        if on_size is not None:
+            on_size()
+        if scaled.total_ns > MAX_SCALED_NS:
+            break
+
+
+def measure_modules(
+    solution_module: str,
+    cases_module: str,
+    repeats: int = 7,
+    warmup: int = 1,
+    sizes: tuple[int, ...] = (),
+    scaled: dict[int, str] | None = None,
+    cold: bool = False,
+    budget_ns: int | None = None,
+    results: str | None = None,
+) -> None:
+    # Run by the harness inside the executor, and saves the results after every size
+    deadline_ns = time.perf_counter_ns() + budget_ns if budget_ns else None
+
+    def save() -> None:
+        if cold:
+            measurement.max_rss_bytes = get_max_rss()
+        if results is not None:
+            save_measurement(measurement, results)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        solution = importlib.import_module(solution_module)
+        cases = load_cases(cases_module)
+        fn = find_entry_point(solution, len(cases[0][0]) if cases else 0)
+        measurement = measure_calls(fn, cases, repeats, warmup)
+        save()
+        if scaled:
+            sizes = tuple(sorted(scaled))
+
+        def load(size: int) -> Cases:
+            # Generated cases per size, or else the examples repeated up to each size
+            if scaled:
+                return load_cases(scaled[size])
+            return scale_cases(cases, size)
+
+        measure_scaling(measurement, fn, load, sizes, repeats, deadline_ns, save)
+
+
+def save_measurement(measurement: Measurement, path: str) -> None:
+    # Replaced as a whole, so that a run killed while saving keeps the previous results
+    partial = f"{path}.partial"
+    with open(partial, "w") as f:
+        f.write(measurement.to_json())
+    os.replace(partial, path)
+
+
+def get_harness_source(
+    solution_path: Path,
+    cases_path: Path,
+    repeats: int = 7,
+    warmup: int = 1,
+    sizes: tuple[int, ...] = (),
+    scaled: dict[int, Path] | None = None,
+    cold: bool = False,
+    budget_ns: int | None = None,
+    results: str | None = None,
+) -> str:
+    modules = {size: get_module_name(path) for size, path in (scaled or {}).items()}
+    return (
+        f"from {__spec__.name} import measure_modules\n\n"
+        f"measure_modules({get_module_name(solution_path)!r}, {get_module_name(cases_path)!r}, "
+        f"repeats={repeats}, warmup={warmup}, sizes={tuple(sizes)!r}, scaled={modules!r}, "
+        f"cold={cold}, budget_ns={budget_ns!r}, results={results!r})\n"
+    )
+
+
+def measure_solution(
+    project: Project,
+    name: str = "solution",
+    executor: WarmExecutor | None = None,
+    limits: ExecutionLimits | None = None,
+    store: MemoryStore | None = None,
+    repeats: int = 7,
+    warmup: int = 1,
+    sizes: tuple[int, ...] = (),
+    scaled: dict[int, Path] | None = None,
+) -> tuple[Outcome, Measurement | None]:
+    # Time and trace the calls of the entry point of `name` on the cases, in the executor
+    limits = limits or ExecutionLimits()
+    solution_path = project.file_map[name]
+    harness_path = solution_path.with_stem(HARNESS_NAME)
+    # Results go through a file, which outlives a worker killed on timeout
+    fd, results = tempfile.mkstemp(prefix="measurement-", suffix=".json")
+    os.close(fd)
+    budget_ns = int(limits.timeout * MEASURE_BUDGET * 1e9) if limits.timeout else None
+    source = get_harness_source(
+        solution_path,
+        project.file_map["cases"],
+        repeats,
+        warmup,
+        sizes,
+        scaled,
+        cold=executor is None,
+        budget_ns=budget_ns,
+        results=results,
+    )
+
+    files = None
+    if store is not None:
+        # The solution with its dependencies, and the cases the harness loads
+        deps = get_dependencies(solution_path, project)
+        paths = [solution_path, *(project.file_map[dep] for dep in deps)]
+        paths += [project.file_map["cases"], *(scaled or {}).values()]
+        files = get_files(store, paths)
+        files[harness_path.as_posix()] = source
+    else:
+        with open(harness_path, "w") as f:
+            f.write(source)
+
+    try:
+        with metrics.span("measure.run", warm=executor is not None):
+            outcome = run_artifact(harness_path, executor, limits, files)
+        # The sizes measured before a timeout are kept
+        with open(results) as f:
+            data = f.read()
+    finally:
+        for path in (results, f"{results}.partial"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+    return outcome, Measurement.from_json(data) if data else None
+
+
+def write_file(path: Path, text: str, store: MemoryStore | None = None) -> None:
+    if store is not None:
+        store.write(path, text)
+        return
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def write_cases_to_file(
+    array: Cases,
+    filename_with_ext: Path,
+    store: MemoryStore | None = None,
+    cases_format: CasesFormat = "literal",
+) -> None:
     # Write a single multi-dimensional array
-    with open(filename_with_ext, "w") as f:
-        f.write(f"{filename_with_ext.stem} = {str(array)}")
+    name = filename_with_ext.stem
+    if cases_format == "json":
+        # Large literals are slow to compile, while JSON is parsed by a C decoder
+        data = json.dumps(array, separators=(",", ":"))
+        write_file(filename_with_ext.with_suffix(CASES_DATA_SUFFIX), data, store)
+        text = JSON_CASES_LOADER.format(name=name, suffix=CASES_DATA_SUFFIX)
+    else:
+        text = f"{name} = {str(array)}"
+    write_file(filename_with_ext, text, store)
+
+
+def write_scaled_cases(
+    scaled: dict[int, Cases],
+    cases_path: Path,
+    store: MemoryStore | None = None,
+    cases_format: CasesFormat = "literal",
+) -> dict[int, Path]:
+    # A cases module per size, next to the cases of the examples
+    paths = {}
+    for size, array in scaled.items():
+        paths[size] = cases_path.with_stem(f"{cases_path.stem}_{size}")
+        write_cases_to_file(array, paths[size], store, cases_format)
+    return paths
+
+
+if __name__ == "__main__":
+    serve_worker(sys.argv[1:])
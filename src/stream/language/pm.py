@@ -1,5 +1,4 @@
 import argparse
-import os
 import sys
 
 from pathlib import Path
@@ -7,17 +6,20 @@ from pathlib import Path
 import dspy
 
 from stream.feedback import ModuleWithCodeFeedback
+from stream.lm import get_lm
+from stream.scheduler import Scheduler
 from stream.language.utils import split_code
 from stream.language.completed.python import Project
 
 
 def main(args):
-    lm = dspy.LM(
-        model="openrouter/nvidia/nemotron-3-nano-30b-a3b:free",
-        api_key=os.environ["OPENROUTER_API_KEY"],
-        temperature=1.0,
-        cache=False,
+    scheduler = Scheduler(
+        rpm=args.rpm,
+        tpm=args.tpm,
+        max_in_flight=args.max_in_flight,
+        max_retries=args.max_retries,
     )
+    lm = get_lm(args.lm_cache, args.lm_cache_size, args.replay, args.fake_lm, scheduler)
     dspy.configure(lm=lm)
 
     # Create the Python meta-project which will encompass the project management code
@@ -93,6 +95,53 @@ if __name__ == "__main__":
         default="src/stream/language/template/pm.py",
         help="Path to the template file",
     )
+    parser.add_argument(
+        "--lm_cache",
+        type=str,
+        default=None,
+        help="Directory caching LM responses (disabled if not set)",
+    )
+    parser.add_argument(
+        "--lm_cache_size",
+        type=int,
+        default=10_000,
+        help="Maximum number of cached LM responses",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="Serve every LM request from `--lm_cache`, failing on requests of a different run",
+    )
+    parser.add_argument(
+        "--fake_lm",
+        type=str,
+        default=None,
+        help="JSON spec of a local stand-in LM (see `stream.lm.FakeLM`), instead of calling the provider",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=int,
+        default=None,
+        help="Maximum number of LM requests per minute (unlimited if not set)",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=int,
+        default=None,
+        help="Maximum number of LM tokens per minute (unlimited if not set)",
+    )
+    parser.add_argument(
+        "--max_in_flight",
+        type=int,
+        default=None,
+        help="Maximum number of concurrent LM requests across all samples (unlimited if not set)",
+    )
+    parser.add_argument(
+        "--max_retries",
+        type=int,
+        default=5,
+        help="Retries of LM requests failing with rate limits or transient errors",
+    )
     args = parser.parse_args()
 
     main(args)
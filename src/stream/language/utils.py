@@ -5,6 +5,59 @@ def split_code(code: str, separator: str) -> tuple[str]:
     return code.partition(separator)
 
 
+def diff_lines(lines_a: list[str], lines_b: list[str]) -> list[tuple[str, str]]:
+    # Line-level diff in the format of `difflib.Differ`, without its intraline matching
+    diffs = []
+    matcher = difflib.SequenceMatcher(None, lines_a, lines_b)
+    for tag, alo, ahi, blo, bhi in matcher.get_opcodes():
+        deleted = [("- ", line) for line in lines_a[alo:ahi]]
+        inserted = [("+ ", line) for line in lines_b[blo:bhi]]
+        if tag == "equal":
+            diffs.extend(("  ", line) for line in lines_a[alo:ahi])
+        elif bhi - blo < ahi - alo:
+            # Like `difflib.Differ`, dump the shorter block of a replacement first
+            diffs.extend(inserted + deleted)
+        else:
+            diffs.extend(deleted + inserted)
+    return diffs
+
+
+def unified_diff(
+    code_a: str, code_b: str, name_a: str, name_b: str, context: int = 2
+) -> str:
+    lines = difflib.unified_diff(
+        code_a.splitlines(), code_b.splitlines(), name_a, name_b, n=context, lineterm=""
+    )
+    return "\n".join(lines)
+
+
+def truncate_middle(text: str, max_chars: int) -> str:
+    # Keep both ends, since tracebacks end with the actual error
+    if len(text) <= max_chars:
+        return text
+    head = max_chars // 2
+    tail = max_chars - head
+    omitted = len(text) - head - tail
+    return f"{text[:head]}\n[... {omitted} characters omitted ...]\n{text[len(text) - tail :]}"
+
+
+def index_markers(indents: list[int], allowed: list[bool], order: range) -> list[bool]:
+    # For each line, whether a marker on the same indent was seen earlier in `order`
+    # without leaving the block, i.e., before reaching a line with a smaller indent
+    found = [False for _ in indents]
+    # Open blocks with strictly increasing indents, and whether they contain a marker
+    blocks: list[list[int | bool]] = []
+    for i in order:
+        while blocks and blocks[-1][0] > indents[i]:
+            blocks.pop()
+        if not blocks or blocks[-1][0] < indents[i]:
+            blocks.append([indents[i], False])
+        found[i] = blocks[-1][1]
+        if allowed[i]:
+            blocks[-1][1] = True
+    return found
+
+
 def validate_with_template(
     template: str | None, code: str, allowed_change: str
 ) -> tuple[bool, str | None]:
@@ -16,18 +69,13 @@ def validate_with_template(
     template = template.replace("\\n", "\\\\n").replace("\\t", "\\\\t")
     code = code.replace("\\n", "\\\\n").replace("\\t", "\\\\t")
 
-    d = difflib.Differ()
-    lines_template = template.splitlines()
-    lines_code = code.splitlines()
-    diffs = list(d.compare(lines_template, lines_code))
-    indents = [None for diff in diffs]
+    diffs = diff_lines(template.splitlines(), code.splitlines())
+    indents = [0 for diff in diffs]
     allowed = [False for diff in diffs]
-    valid = [False for diff in diffs]
 
     # Populate the indent and marker for each line
     indent_previous = 0
-    for i, diff in enumerate(diffs):
-        _, diff_code = diff[:2], diff[2:]
+    for i, (_, diff_code) in enumerate(diffs):
         # Treat newlines as part of the previous level set
         indent_current = (
             indent_previous
@@ -39,32 +87,18 @@ def validate_with_template(
         if diff_code.strip().startswith(allowed_change):
             allowed[i] = True
 
-    # For each changed line, determine if an allowed line is on its level set
-    for i, diff in enumerate(diffs):
-        diff_type, diff_code = diff[:2], diff[2:]
-        indent_current = indents[i]
-
-        # Marker lines should auto-pass
-        if allowed[i] or diff_type == "  ":
-            valid[i] = True
-
-        if diff_type in ["- ", "+ "]:
-            # Search for the marker below
-            for j in range(i + 1, len(diffs)):
-                if indent_current == indents[j] and allowed[j]:
-                    valid[i] = True
-                if indent_current > indents[j]:
-                    break
-
-            # Search for the marker above
-            for j in range(i - 1, -1, -1):
-                if indent_current == indents[j] and allowed[j]:
-                    valid[i] = True
-                if indent_current > indents[j]:
-                    break
-
-    if not all(valid):
+    # Index the markers on the level set of each line, both above and below it
+    above = index_markers(indents, allowed, range(len(diffs)))
+    below = index_markers(indents, allowed, range(len(diffs) - 1, -1, -1))
+
+    # Unchanged and marker lines auto-pass, changed lines need a marker on their level set
+    valid = all(
+        diff_type == "  " or allowed[i] or above[i] or below[i]
+        for i, (diff_type, _) in enumerate(diffs)
+    )
+
+    if not valid:
         feedback = f"You must strictly follow the provided template and \
 only modify the code where it is marked with {allowed_change}!"
 
-    return all(valid), feedback
+    return valid, feedback
@@ -0,0 +1,343 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from concurrent.futures import Future
+from typing import Any
+
+import dspy
+from litellm import ModelResponse, RateLimitError
+
+from stream.cache import DiskCache
+from stream.scheduler import Scheduler
+
+
+MODEL = "openrouter/nvidia/nemotron-3-nano-30b-a3b:free"
+
+
+def get_request_key(
+    lm: dspy.LM,
+    prompt: str | None,
+    messages: list[dict[str, Any]] | None,
+    kwargs: dict[str, Any],
+) -> str:
+    # Credentials do not change the response, so they are left out of the key
+    params = {
+        k: v for k, v in {**lm.kwargs, **kwargs}.items() if not k.startswith("api_")
+    }
+    return DiskCache.key(
+        "lm",
+        lm.model,
+        lm.model_type,
+        json.dumps(messages or prompt, sort_keys=True, default=str),
+        json.dumps(params, sort_keys=True, default=str),
+    )
+
+
+def estimate_tokens(prompt: str | None, messages: list[dict[str, Any]] | None) -> int:
+    # Roughly four characters per token, until the provider reports the actual usage
+    if messages is None:
+        return len(prompt or "") // 4
+    return sum(len(str(m.get("content", ""))) for m in messages) // 4
+
+
+class ScheduledLM(dspy.LM):
+    # Sends requests to the provider through a scheduler shared by all samples
+    def __init__(self, model: str, scheduler: Scheduler | None = None, **kwargs):
+        if scheduler is not None:
+            # The scheduler retries with backoff, instead of the provider client
+            kwargs["num_retries"] = 0
+        super().__init__(model, **kwargs)
+        self.scheduler = scheduler
+
+    def complete(
+        self,
+        prompt: str | None,
+        messages: list[dict[str, Any]] | None,
+        kwargs: dict[str, Any],
+    ):
+        return super().forward(prompt=prompt, messages=messages, **kwargs)
+
+    async def acomplete(
+        self,
+        prompt: str | None,
+        messages: list[dict[str, Any]] | None,
+        kwargs: dict[str, Any],
+    ):
+        return await super().aforward(prompt=prompt, messages=messages, **kwargs)
+
+    def forward(
+        self,
+        prompt: str | None = None,
+        messages: list[dict[str, Any]] | None = None,
+        **kwargs,
+    ):
+        if self.scheduler is None:
+            return self.complete(prompt, messages, kwargs)
+        return self.scheduler.call(
+            lambda: self.complete(prompt, messages, kwargs),
+            estimate_tokens(prompt, messages),
+        )
+
+    async def aforward(
+        self,
+        prompt: str | None = None,
+        messages: list[dict[str, Any]] | None = None,
+        **kwargs,
+    ):
+        if self.scheduler is None:
+            return await self.acomplete(prompt, messages, kwargs)
+        return await self.scheduler.acall(
+            lambda: self.acomplete(prompt, messages, kwargs),
+            estimate_tokens(prompt, messages),
+        )
+
+
+class CachedLM(ScheduledLM):
+    # Serves repeated requests from disk, and never calls the provider when replaying
+    def __init__(
+        self,
+        model: str,
+        response_cache: DiskCache,
+        replay: bool = False,
+        **kwargs,
+    ):
+        super().__init__(model, cache=False, **kwargs)
+        self.response_cache = response_cache
+        self.replay = replay
+        # Identical requests in flight at the same time only reach the provider once
+        self.in_flight: dict[str, Future] = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, key: str) -> ModelResponse | None:
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            response = ModelResponse(**json.loads(cached))
+            response.cache_hit = True
+            return response
+        if self.replay:
+            raise LookupError(f"No cached response for request {key} in replay mode")
+        return None
+
+    def claim(self, key: str) -> tuple[Future, bool]:
+        # Returns the future of the request, and whether the caller has to send it
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = self.in_flight[key] = Future()
+            return future, True
+
+    def release(
+        self, key: str, future: Future, response: Any, error: BaseException | None
+    ):
+        if error is None:
+            self.response_cache.set(key, response.model_dump_json(warnings=False))
+            future.set_result(response)
+        else:
+            future.set_exception(error)
+        with self.lock:
+            del self.in_flight[key]
+
+    def forward(
+        self,
+        prompt: str | None = None,
+        messages: list[dict[str, Any]] | None = None,
+        **kwargs,
+    ):
+        key = get_request_key(self, prompt, messages, kwargs)
+        if (response := self.lookup(key)) is not None:
+            return response
+
+        future, owner = self.claim(key)
+        if not owner:
+            return future.result()
+
+        response, error = None, None
+        try:
+            response = super().forward(prompt=prompt, messages=messages, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.release(key, future, response, error)
+        return response
+
+    async def aforward(
+        self,
+        prompt: str | None = None,
+        messages: list[dict[str, Any]] | None = None,
+        **kwargs,
+    ):
+        key = get_request_key(self, prompt, messages, kwargs)
+        if (response := self.lookup(key)) is not None:
+            return response
+
+        future, owner = self.claim(key)
+        if not owner:
+            return await asyncio.wrap_future(future)
+
+        response, error = None, None
+        try:
+            response = await super().aforward(
+                prompt=prompt, messages=messages, **kwargs
+            )
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.release(key, future, response, error)
+        return response
+
+
+# The output fields requested by the chat adapters, in order, at the end of the last message
+OUTPUT_FIELDS_PATTERN = re.compile(
+    r"Respond with the corresponding output fields(.*)", re.DOTALL
+)
+FIELD_PATTERN = re.compile(r"\[\[ ## (\w+) ## \]\]")
+
+
+class FakeLM(ScheduledLM):
+    # A local stand-in for the provider, for load testing without network access
+    def __init__(
+        self,
+        model: str,
+        outputs: dict[str, str | list[str]] | None = None,
+        latency: float = 0.0,
+        latency_sigma: float = 0.0,
+        error_rate: float = 0.0,
+        recorded: DiskCache | None = None,
+        seed: int | None = None,
+        **kwargs,
+    ):
+        super().__init__(model, cache=False, **kwargs)
+        # Scripted values per output field, drawn at random when there are several
+        self.outputs = outputs or {}
+        # Latencies are log-normal around the median, as provider latencies tend to be
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        # Responses recorded by a `CachedLM` are served for the requests they match
+        self.recorded = recorded
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self) -> tuple[float, bool, random.Random]:
+        with self.lock:
+            delay = self.latency * self.rng.lognormvariate(0.0, self.latency_sigma)
+            failed = self.rng.random() < self.error_rate
+            return delay, failed, random.Random(self.rng.random())
+
+    def respond(
+        self,
+        prompt: str | None,
+        messages: list[dict[str, Any]] | None,
+        kwargs: dict[str, Any],
+        failed: bool,
+        rng: random.Random,
+    ) -> ModelResponse:
+        if failed:
+            raise RateLimitError(
+                "Scripted failure", llm_provider="fake", model=self.model
+            )
+
+        if self.recorded is not None:
+            cached = self.recorded.get(get_request_key(self, prompt, messages, kwargs))
+            if cached is not None:
+                return ModelResponse(**json.loads(cached))
+
+        messages = messages or [{"role": "user", "content": prompt}]
+        match = OUTPUT_FIELDS_PATTERN.search(messages[-1]["content"])
+        names = FIELD_PATTERN.findall(match.group(1)) if match else []
+
+        content = ""
+        for name in names:
+            if name == "completed":
+                break
+            value = self.outputs.get(name, "pass")
+            if isinstance(value, list):
+                value = rng.choice(value)
+            content += f"[[ ## {name} ## ]]\n{value}\n\n"
+        content += "[[ ## completed ## ]]"
+
+        prompt_tokens = estimate_tokens(None, messages)
+        completion_tokens = len(content) // 4
+        return ModelResponse(
+            model=self.model,
+            choices=[
+                {"index": 0, "message": {"role": "assistant", "content": content}}
+            ],
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+
+    def complete(
+        self,
+        prompt: str | None,
+        messages: list[dict[str, Any]] | None,
+        kwargs: dict[str, Any],
+    ):
+        delay, failed, rng = self.draw()
+        time.sleep(delay)
+        return self.respond(prompt, messages, kwargs, failed, rng)
+
+    async def acomplete(
+        self,
+        prompt: str | None,
+        messages: list[dict[str, Any]] | None,
+        kwargs: dict[str, Any],
+    ):
+        delay, failed, rng = self.draw()
+        await asyncio.sleep(delay)
+        return self.respond(prompt, messages, kwargs, failed, rng)
+
+
+def get_fake_lm(spec_path: str, scheduler: Scheduler | None = None) -> FakeLM:
+    # The spec is a JSON file with the keyword arguments of `FakeLM`
+    with open(spec_path, encoding="utf-8") as f:
+        spec = json.load(f)
+    if "recorded" in spec:
+        spec["recorded"] = DiskCache(spec["recorded"])
+    return FakeLM(model=MODEL, scheduler=scheduler, temperature=1.0, **spec)
+
+
+def get_lm(
+    cache_dir: str | None = None,
+    cache_size: int = 10_000,
+    replay: bool = False,
+    fake: str | None = None,
+    scheduler: Scheduler | None = None,
+) -> dspy.LM:
+    # Transient provider failures are always retried with backoff
+    scheduler = scheduler or Scheduler()
+    if fake is not None:
+        return get_fake_lm(fake, scheduler)
+    if cache_dir is None:
+        if replay:
+            raise ValueError("Replaying a run requires the directory of its LM cache")
+        return ScheduledLM(
+            model=MODEL,
+            scheduler=scheduler,
+            api_key=os.environ["OPENROUTER_API_KEY"],
+            temperature=1.0,
+            cache=False,
+        )
+
+    return CachedLM(
+        model=MODEL,
+        response_cache=DiskCache(cache_dir, max_entries=cache_size),
+        replay=replay,
+        scheduler=scheduler,
+        # Replaying a run does not need credentials
+        api_key=os.environ.get("OPENROUTER_API_KEY")
+        if replay
+        else os.environ["OPENROUTER_API_KEY"],
+        temperature=1.0,
+    )
@@ -1,22 +1,37 @@
 import argparse
-import os
 import sys
 import random
+import threading
+import time
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import datasets
 import dspy
 
+from stream.cache import DiskCache
 from stream.project import FileAdapter
-from stream.feedback import ModuleWithCodeFeedback
+from stream.feedback import FeedbackState, ModuleWithCodeFeedback
+from stream.journal import Journal
+from stream.lm import get_lm
+from stream.scheduler import Scheduler
+from stream.store import MemoryStore
+from stream.metrics import metrics
 
+from stream.language.completed.python import CasesFormat
+from stream.language.completed.python import ExecutionLimits
 from stream.language.completed.python import Project
+from stream.language.completed.python import WarmExecutor
 from stream.language.completed.python import write_cases_to_file
+from stream.language.completed.python import write_scaled_cases
 
-from stream.dataset import get_dataset, get_problem_description
+from stream.dataset import get_constraints, get_dataset, get_problem, get_sample_indices
+from stream.generate import generate_cases
 
 
-def get_project_structure(name: str, project_class: type) -> Project:
+def get_project_structure(
+    name: str, project_class: type, cases_format: CasesFormat = "literal"
+) -> Project:
     # Create files without dependencies first
     files = {
         "cases": project_class.File(Path(f"{name}/cases")),
@@ -49,20 +64,165 @@ def get_project_structure(name: str, project_class: type) -> Project:
         ]
     )
 
-    project = project_class(files=list(files.values()))
+    project = project_class(files=list(files.values()), cases_format=cases_format)
     return project
 
 
+# Redirecting stdout is process-wide, so only one history can be written at a time
+history_lock = threading.Lock()
+
+
+def save_history(module: dspy.Module, path: str, n: int = 5, mode: str = "w") -> None:
+    with history_lock:
+        # Save the original stdout to restore it later
+        original_stdout = sys.stdout
+        with open(path, mode) as f:
+            # Redirect stdout to the file
+            sys.stdout = f
+            # Use the module history, which only contains the calls of this sample
+            module.inspect_history(n=n)
+        # Restore stdout to the original (usually the console)
+        sys.stdout = original_stdout
+
+
+def solve_sample(
+    i: int,
+    ds: datasets.Dataset,
+    signature: type[dspy.Signature],
+    args: argparse.Namespace,
+    executor: WarmExecutor | None = None,
+    cache: DiskCache | None = None,
+    journal: Journal | None = None,
+    resume: FeedbackState | None = None,
+) -> dspy.Prediction:
+    start = time.perf_counter()
+    state = resume or FeedbackState()
+
+    def on_step(state: FeedbackState) -> None:
+        if journal is not None:
+            journal.step(i, state, time.perf_counter() - start)
+
+    # The signature is shared by all samples, which only differ in their project structure
+    sample_dir = f"{args.proj_name}/sample{i}"
+    sample_proj_structure = get_project_structure(
+        sample_dir, Project, args.cases_format
+    )
+    # Projects kept in memory are only laid out on disk once the sample is finished
+    store = MemoryStore() if args.in_memory else None
+    if store is None:
+        sample_proj_structure.initialize_modules()
+
+    desc, cases = get_problem(ds, i)
+
+    cases_path = sample_proj_structure.file_map["cases"]
+    write_cases_to_file(cases, cases_path, store, sample_proj_structure.cases_format)
+
+    # Inputs generated at larger sizes, within the constraints, for measuring the solution
+    measure = args.measure or args.optimize
+    scaled = None
+    if measure and args.scale_sizes:
+        names, constraints = get_constraints(ds, i)
+        with metrics.tags(sample=i), metrics.span("sample.generate"):
+            try:
+                generated = generate_cases(
+                    cases,
+                    names,
+                    constraints,
+                    tuple(args.scale_sizes),
+                    seed=args.seed + i,
+                )
+            except Exception as e:
+                # Generation reads free text, so when it fails, the solution is measured
+                # on the examples repeated up to each size instead
+                metrics.count("sample.ungenerated", error=type(e).__name__)
+                generated = {}
+            if generated:
+                scaled = write_scaled_cases(
+                    generated, cases_path, store, sample_proj_structure.cases_format
+                )
+
+    # Define an AI module that is templated (prompted) to solve the task
+    module = dspy.Predict(signature)
+    module = ModuleWithCodeFeedback(
+        base_module=module,
+        project=sample_proj_structure,
+        executor=executor,
+        cache=cache,
+        on_step=on_step,
+        regenerate_failing=args.regenerate_failing,
+        compact=args.compact_trajectory,
+        trajectory_tokens=args.trajectory_tokens,
+        fail_fast=args.fail_fast,
+        store=store,
+        measure="solution" if measure else None,
+        repeats=args.measure_repeats,
+        sizes=tuple(args.scale_sizes),
+        scaled=scaled,
+        optimize=args.optimize,
+        min_improvement=args.min_improvement,
+        limits=ExecutionLimits(
+            timeout=args.timeout,
+            cpu_seconds=args.cpu_limit,
+            memory_bytes=args.memory_limit * 2**20 if args.memory_limit else None,
+            max_output=args.max_output,
+        ),
+    )
+
+    # Interrupted after the last step, but before it was recorded as done
+    if module.finished(state):
+        if journal is not None:
+            journal.done(i, state, state.success(module.success_message), 0.0)
+        return dspy.Prediction()
+
+    # Form inputs
+    inputs = {
+        "project": sample_proj_structure,
+        "problem": desc,
+        # The cases as a literal, whichever way they are stored
+        "cases": f"{cases_path.stem} = {cases}",
+    }
+
+    with (
+        metrics.tags(sample=i),
+        metrics.span("sample"),
+        dspy.context(adapter=FileAdapter()),
+    ):
+        pred = module(state=state, **inputs)
+
+    if store is not None:
+        store.flush()
+    # Keep the history of the calls before the interruption
+    save_history(module, f"{sample_dir}/history.txt", mode="a" if resume else "w")
+    if journal is not None:
+        seconds = time.perf_counter() - start
+        journal.done(i, state, state.success(module.success_message), seconds)
+    return pred
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    shard, _, num_shards = value.partition("/")
+    try:
+        shard, num_shards = int(shard), int(num_shards)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected a shard as 'k/n', got '{value}'")
+    if not 0 <= shard < num_shards:
+        raise argparse.ArgumentTypeError(f"Shard {shard} is not in [0, {num_shards})")
+    return shard, num_shards
+
+
 def main(args):
     # RNG
     random.seed(args.seed)
+    # Optionally time the stages of solving each sample
+    metrics.enabled = args.metrics is not None
 
-    lm = dspy.LM(
-        model="openrouter/nvidia/nemotron-3-nano-30b-a3b:free",
-        api_key=os.environ["OPENROUTER_API_KEY"],
-        temperature=1.0,
-        cache=False,
+    scheduler = Scheduler(
+        rpm=args.rpm,
+        tpm=args.tpm,
+        max_in_flight=args.max_in_flight,
+        max_retries=args.max_retries,
     )
+    lm = get_lm(args.lm_cache, args.lm_cache_size, args.replay, args.fake_lm, scheduler)
     dspy.configure(lm=lm)
 
     class ProblemSolvingGeneric(dspy.Signature):
@@ -102,56 +262,84 @@ def main(args):
         ProblemSolvingGeneric.__doc__.format(language=args.language)
     )
 
-    # Load dataset
-    ds: datasets.Dataset = get_dataset("newfacade/LeetCodeDataset")
-    train_idx = list(range(len(ds["train"])))
-    random.shuffle(train_idx)
-
-    for i in train_idx:
-        # Replace the project structure with a sample-specific one in the signature
-        sample_dir = f"{args.proj_name}/sample{i}"
-        sample_proj_structure = get_project_structure(sample_dir, Project)
-        sample_proj_structure.initialize_modules()
-        ProblemSolving = ProblemSolvingGeneric.with_updated_fields(
-            "project", type_=Project, desc=sample_proj_structure
-        )
-
-        # Define an AI module that is templated (prompted) to solve the task
-        module = dspy.Predict(ProblemSolving)
-        module = ModuleWithCodeFeedback(
-            base_module=module,
-            project=sample_proj_structure,
+    # Load dataset, only reading the column that is used
+    skip = set()
+    if args.preprocessed:
+        # Problems were parsed ahead of time, and the unparseable ones are known
+        ds: datasets.Dataset = datasets.load_from_disk(args.preprocessed)
+        skip = {i for i, error in enumerate(ds["error"]) if error is not None}
+    else:
+        ds: datasets.Dataset = get_dataset(
+            "newfacade/LeetCodeDataset", split="train", columns=["problem_description"]
         )
+    shard, num_shards = args.shard
+    train_idx = get_sample_indices(len(ds), shard, num_shards, args.limit, skip)
 
-        sample = ds["train"][i]
-        if "Constraints:" not in sample["problem_description"]:
-            raise ValueError("Found a sample without 'Constraints:'!")
+    # Optionally skip the samples finished by a previous run, and resume the others
+    journal, progress = None, {}
+    if args.journal:
+        journal = Journal(args.journal)
+        progress = journal.load()
+        train_idx = [i for i in train_idx if not (i in progress and progress[i].done)]
 
-        desc, cases = get_problem_description(sample["problem_description"])
+    def resume(i: int) -> FeedbackState | None:
+        return progress[i].state if i in progress else None
 
-        if "Example:" in desc:
-            raise ValueError("Examples should not be found in the problem description!")
+    # Optionally keep warm interpreters around to execute the generated code
+    executor = None
+    if args.warm_executors > 0:
+        executor = WarmExecutor(workers=args.warm_executors)
+    # Optionally re-use the outcomes of code that was already executed
+    cache = None
+    if args.exec_cache:
+        cache = DiskCache(args.exec_cache, max_entries=args.exec_cache_size)
 
-        write_cases_to_file(cases, sample_proj_structure.file_map["cases"])
+    try:
+        if args.workers <= 1:
+            for i in train_idx:
+                solve_sample(
+                    i,
+                    ds,
+                    ProblemSolvingGeneric,
+                    args,
+                    executor,
+                    cache,
+                    journal,
+                    resume(i),
+                )
+            return
 
-        # Form inputs
-        inputs = {
-            "project": None,
-            "problem": desc,
-            "cases": sample_proj_structure.file_map["cases"].read_text(),
-        }
-
-        with dspy.context(adapter=FileAdapter()):
-            pred = module(**inputs)
-
-        # Save the original stdout to restore it later
-        original_stdout = sys.stdout
-        with open(f"{sample_dir}/history.txt", "w") as f:
-            # Redirect stdout to the file
-            sys.stdout = f
-            dspy.inspect_history(n=5)
-        # Restore stdout to the original (usually the console)
-        sys.stdout = original_stdout
+        # Each sample owns its directory, module, and adapter, so samples are independent
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futures = [
+                pool.submit(
+                    solve_sample,
+                    i,
+                    ds,
+                    ProblemSolvingGeneric,
+                    args,
+                    executor,
+                    cache,
+                    journal,
+                    resume(i),
+                )
+                for i in train_idx
+            ]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                # Do not keep spending LM calls on queued samples after a failure
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        if executor is not None:
+            executor.close()
+        if args.metrics is not None:
+            metrics.dump(args.metrics)
+            print(metrics.summary())
+            print(metrics.summary(by=("step",)))
 
 
 if __name__ == "__main__":
@@ -181,6 +369,195 @@ if __name__ == "__main__":
         default=2026,
         help="RNG seed",
     )
+    parser.add_argument(
+        "--preprocessed",
+        type=str,
+        default=None,
+        help="Location of the dataset parsed by `stream.preprocess`, instead of parsing each run",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Maximum number of samples to solve",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=(0, 1),
+        help="Solve only shard k of n (as 'k/n') of the shuffled samples, for splitting runs across processes",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of samples to solve concurrently",
+    )
+    parser.add_argument(
+        "--warm_executors",
+        type=int,
+        default=0,
+        help="Number of warm interpreters executing generated code (0 spawns a process per run)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="Wall-clock limit in seconds for executing generated code",
+    )
+    parser.add_argument(
+        "--cpu_limit",
+        type=int,
+        default=None,
+        help="CPU time limit in seconds for executing generated code",
+    )
+    parser.add_argument(
+        "--memory_limit",
+        type=int,
+        default=None,
+        help="Address space limit in MiB for executing generated code",
+    )
+    parser.add_argument(
+        "--max_output",
+        type=int,
+        default=2**16,
+        help="Maximum number of characters kept from each output stream of generated code",
+    )
+    parser.add_argument(
+        "--exec_cache",
+        type=str,
+        default=None,
+        help="Directory caching the outcomes of executed code (disabled if not set)",
+    )
+    parser.add_argument(
+        "--exec_cache_size",
+        type=int,
+        default=10_000,
+        help="Maximum number of cached execution outcomes",
+    )
+    parser.add_argument(
+        "--lm_cache",
+        type=str,
+        default=None,
+        help="Directory caching LM responses (disabled if not set)",
+    )
+    parser.add_argument(
+        "--lm_cache_size",
+        type=int,
+        default=10_000,
+        help="Maximum number of cached LM responses",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="Serve every LM request from `--lm_cache`, failing on requests of a different run",
+    )
+    parser.add_argument(
+        "--fake_lm",
+        type=str,
+        default=None,
+        help="JSON spec of a local stand-in LM (see `stream.lm.FakeLM`), instead of calling the provider",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=int,
+        default=None,
+        help="Maximum number of LM requests per minute (unlimited if not set)",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=int,
+        default=None,
+        help="Maximum number of LM tokens per minute (unlimited if not set)",
+    )
+    parser.add_argument(
+        "--max_in_flight",
+        type=int,
+        default=None,
+        help="Maximum number of concurrent LM requests across all samples (unlimited if not set)",
+    )
+    parser.add_argument(
+        "--max_retries",
+        type=int,
+        default=5,
+        help="Retries of LM requests failing with rate limits or transient errors",
+    )
+    parser.add_argument(
+        "--regenerate_failing",
+        action="store_true",
+        help="After the first step, only regenerate the outputs that failed, keeping the passing code",
+    )
+    parser.add_argument(
+        "--fail_fast",
+        action="store_true",
+        help="Stop executing the outputs of a step after the first failure",
+    )
+    parser.add_argument(
+        "--compact_trajectory",
+        action="store_true",
+        help="Send earlier attempts as diffs against the latest one, and shorten execution outcomes",
+    )
+    parser.add_argument(
+        "--trajectory_tokens",
+        type=int,
+        default=None,
+        help="Token budget for the attempts and outcome of each output with `--compact_trajectory`",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="File to write stage timings to as JSON lines, also summarized at the end (disabled if not set)",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        default=None,
+        help="File recording the progress of each sample, for resuming an interrupted run (disabled if not set)",
+    )
+    parser.add_argument(
+        "--measure",
+        action="store_true",
+        help="Measure the runtime and memory of each passing solution on the cases, recorded in the journal",
+    )
+    parser.add_argument(
+        "--measure_repeats",
+        type=int,
+        default=7,
+        help="Number of timed runs per case when measuring a solution",
+    )
+    parser.add_argument(
+        "--scale_sizes",
+        type=int,
+        nargs="*",
+        default=[1_000, 10_000, 100_000],
+        help="Sizes of the inputs generated within the constraints when measuring a solution, to fit its complexity",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="Once the solution passes, keep regenerating it with its measurements as advice, while it gets faster",
+    )
+    parser.add_argument(
+        "--min_improvement",
+        type=float,
+        default=0.05,
+        help="Fraction by which the runtime must drop for the optimization to continue",
+    )
+    parser.add_argument(
+        "--cases_format",
+        type=str,
+        choices=["literal", "json"],
+        default="literal",
+        help="Store cases as a Python literal, or as JSON next to a module that loads it (faster for large cases)",
+    )
+    parser.add_argument(
+        "--in_memory",
+        action="store_true",
+        help="Keep generated projects in memory while solving, and only write the final ones to disk (requires warm executors)",
+    )
     args = parser.parse_args()
+    if args.in_memory and args.warm_executors == 0:
+        parser.error("--in_memory requires --warm_executors")
 
     main(args)
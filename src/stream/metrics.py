@@ -0,0 +1,107 @@
+import contextvars
+import json
+import math
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+
+# Tags of the enclosing sample and step, attached to every record
+current_tags: contextvars.ContextVar[dict[str, Any]] = contextvars.ContextVar(
+    "current_tags", default={}
+)
+
+
+def percentile(values: list[float], q: float) -> float:
+    # Nearest-rank percentile of sorted values
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+class Metrics:
+    # Spans, counters and histograms of the stages of a run, recorded in memory
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.records: list[dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def record(self, kind: str, name: str, value: float, tags: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        record = {
+            "kind": kind,
+            "name": name,
+            "value": value,
+            **current_tags.get(),
+            **tags,
+        }
+        with self.lock:
+            self.records.append(record)
+
+    @contextmanager
+    def tags(self, **tags) -> Iterator[None]:
+        token = current_tags.set({**current_tags.get(), **tags})
+        try:
+            yield
+        finally:
+            current_tags.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **tags) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record("span", name, time.perf_counter() - start, tags)
+
+    def count(self, name: str, value: int = 1, **tags) -> None:
+        self.record("counter", name, value, tags)
+
+    def observe(self, name: str, value: float, **tags) -> None:
+        self.record("histogram", name, value, tags)
+
+    def dump(self, path: Path | str) -> None:
+        with self.lock, open(path, "w", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def summary(self, by: tuple[str, ...] = ()) -> str:
+        # One row per record name, and per value of the tags in `by`
+        groups = defaultdict(list)
+        with self.lock:
+            for record in self.records:
+                key = (record["name"], record["kind"], *(record.get(tag) for tag in by))
+                groups[key].append(record["value"])
+
+        header = ["name", "kind", *by, "count", "total", "mean", "p50", "p95", "max"]
+        rows = [header]
+        for key in sorted(groups, key=lambda k: tuple(str(part) for part in k)):
+            values = sorted(groups[key])
+            total = sum(values)
+            stats = [
+                total,
+                total / len(values),
+                percentile(values, 0.5),
+                percentile(values, 0.95),
+                values[-1],
+            ]
+            rows.append(
+                [
+                    *(str(part) for part in key),
+                    str(len(values)),
+                    *(f"{v:.4g}" for v in stats),
+                ]
+            )
+
+        widths = [max(len(row[j]) for row in rows) for j in range(len(header))]
+        return "\n".join(
+            "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+            for row in rows
+        )
+
+
+# Shared by all modules of a run, and only recording once enabled
+metrics = Metrics()
@@ -0,0 +1,45 @@
+import argparse
+
+from stream.dataset import get_dataset, get_problem_descriptions
+
+
+def main(args):
+    ds = get_dataset(args.name, split="train", columns=["problem_description"])
+
+    # Parse every problem once, keeping the row order so that indices match the dataset
+    ds = ds.map(
+        get_problem_descriptions,
+        batched=True,
+        num_proc=args.num_proc,
+        remove_columns=["problem_description"],
+        desc="Parsing problems",
+    )
+    ds.save_to_disk(args.output)
+
+    failures = sum(error is not None for error in ds["error"])
+    print(f"Saved {len(ds)} problems to {args.output}, {failures} failed to parse")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--name",
+        type=str,
+        default="newfacade/LeetCodeDataset",
+        help="Dataset to preprocess",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="./data/LeetCodeDataset",
+        help="Location of the preprocessed dataset",
+    )
+    parser.add_argument(
+        "--num_proc",
+        type=int,
+        default=None,
+        help="Number of processes parsing problems",
+    )
+    args = parser.parse_args()
+
+    main(args)
@@ -6,13 +6,23 @@ from dspy import Signature
 from dspy.clients.lm import LM
 from dspy.adapters.types.base_type import split_message_content_for_custom_types
 
+from stream.metrics import metrics
 from stream.language.completed.python import Project
 from stream.language.completed.python import generate_use_statement
+from stream.store import MemoryStore
 
 
-def write_code(code: dspy.Prediction, path: Path, extra: str | None = None):
-    # Write the code to file
+def write_code(
+    code: dspy.Prediction,
+    path: Path,
+    extra: str | None = None,
+    store: MemoryStore | None = None,
+):
+    # Write the code to file, or keep it in memory until the store is flushed
     code = "\n\n".join([code, extra]) if extra else code
+    if store is not None:
+        store.write(path, code)
+        return
     with open(path, "w") as f:
         f.write(code)
 
@@ -27,17 +37,26 @@ class FileAdapter(dspy.ChatAdapter):
         demos: list[dict[str, Any]],
         inputs: dict[str, Any],
     ) -> list[dict[str, Any]]:
-        self.project = signature.input_fields["project"]
+        # The project of the sample is passed as input, and the signature holds a default one
+        project = inputs.get("project")
+        if not isinstance(project, Project):
+            project = signature.input_fields["project"].json_schema_extra["desc"]
+        self.project: Project = project
         signature = signature.delete("project")
 
         # TODO: Re-order the output fields in topological order
-        processed_signature = self._call_preprocess(lm, lm_kwargs, signature, inputs)
-        inputs = self.format(processed_signature, demos, inputs)
+        with metrics.span("adapter.format"):
+            processed_signature = self._call_preprocess(
+                lm, lm_kwargs, signature, inputs
+            )
+            inputs = self.format(processed_signature, demos, inputs)
 
-        outputs = lm(messages=inputs, **lm_kwargs)
-        return self._call_postprocess(
-            processed_signature, signature, outputs, lm, lm_kwargs
-        )
+        with metrics.span("adapter.lm"):
+            outputs = lm(messages=inputs, **lm_kwargs)
+        with metrics.span("adapter.parse"):
+            return self._call_postprocess(
+                processed_signature, signature, outputs, lm, lm_kwargs
+            )
 
     def format_output_interactions(
         self,
@@ -47,7 +66,7 @@ class FileAdapter(dspy.ChatAdapter):
 
         # Cache use statements for each pair of locations
         use_statements = dict()
-        info: Project = self.project.json_schema_extra["desc"]
+        info = self.project
 
         for name, field in signature.output_fields.items():
             # Early exit for non-code fields
@@ -0,0 +1,138 @@
+import asyncio
+import random
+import threading
+import time
+
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable
+
+from litellm import (
+    APIConnectionError,
+    InternalServerError,
+    RateLimitError,
+    ServiceUnavailableError,
+)
+
+from stream.metrics import metrics
+
+
+# Provider errors that go away when the request is sent again later
+RETRYABLE = (
+    APIConnectionError,
+    InternalServerError,
+    RateLimitError,
+    ServiceUnavailableError,
+)
+WINDOW = 60.0
+
+
+class Scheduler:
+    # Admits LM requests within per-minute budgets, and retries transient failures
+    def __init__(
+        self,
+        rpm: int | None = None,
+        tpm: int | None = None,
+        max_in_flight: int | None = None,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        seed: int | None = None,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rng = random.Random(seed)
+
+        # The start time and tokens of every request admitted within the last minute
+        self.window: deque[list[float]] = deque()
+        self.lock = threading.Lock()
+        # Shared by all samples, so that the provider never sees more concurrent requests
+        self.slots = threading.Semaphore(max_in_flight) if max_in_flight else None
+
+    def reserve(self, tokens: int) -> tuple[float, list[float] | None]:
+        # Returns the time to wait before trying again, or the entry of the admitted request
+        with self.lock:
+            now = time.monotonic()
+            while self.window and self.window[0][0] <= now - WINDOW:
+                self.window.popleft()
+
+            used = sum(entry[1] for entry in self.window)
+            if (self.rpm is None or len(self.window) < self.rpm) and (
+                # A request above the whole budget is still sent, once the window is empty
+                self.tpm is None or used + tokens <= self.tpm or not self.window
+            ):
+                entry = [now, tokens]
+                self.window.append(entry)
+                return 0.0, entry
+            return self.window[0][0] + WINDOW - now, None
+
+    def settle(self, entry: list[float], response: Any) -> None:
+        # Replace the estimate with the tokens the provider actually counted
+        usage = getattr(response, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        if total is not None:
+            with self.lock:
+                entry[1] = total
+
+    def delay(self, attempt: int) -> float:
+        # Full jitter, so that requests failing together do not retry together
+        with self.lock:
+            return self.rng.uniform(
+                0.0, min(self.max_backoff, self.backoff * 2**attempt)
+            )
+
+    def admit(self, tokens: int) -> list[float]:
+        start = time.perf_counter()
+        while True:
+            wait, entry = self.reserve(tokens)
+            if entry is not None:
+                metrics.observe("lm.wait", time.perf_counter() - start)
+                return entry
+            time.sleep(wait)
+
+    async def aadmit(self, tokens: int) -> list[float]:
+        start = time.perf_counter()
+        while True:
+            wait, entry = self.reserve(tokens)
+            if entry is not None:
+                metrics.observe("lm.wait", time.perf_counter() - start)
+                return entry
+            await asyncio.sleep(wait)
+
+    def call(self, fn: Callable[[], Any], tokens: int) -> Any:
+        for attempt in range(self.max_retries + 1):
+            entry = self.admit(tokens)
+            with self.slots or nullcontext():
+                try:
+                    response = fn()
+                except RETRYABLE:
+                    if attempt == self.max_retries:
+                        raise
+                else:
+                    self.settle(entry, response)
+                    return response
+            metrics.count("lm.retries")
+            time.sleep(self.delay(attempt))
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], tokens: int) -> Any:
+        for attempt in range(self.max_retries + 1):
+            entry = await self.aadmit(tokens)
+            # Poll for a slot, since blocking would stall the event loop
+            while self.slots is not None and not self.slots.acquire(blocking=False):
+                await asyncio.sleep(0.01)
+            try:
+                response = await fn()
+            except RETRYABLE:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                self.settle(entry, response)
+                return response
+            finally:
+                if self.slots is not None:
+                    self.slots.release()
+            metrics.count("lm.retries")
+            await asyncio.sleep(self.delay(attempt))
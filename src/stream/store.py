@@ -0,0 +1,30 @@
+import threading
+
+from pathlib import Path
+
+
+class MemoryStore:
+    # Generated files kept in memory, and only written to disk when flushed
+    def __init__(self):
+        self.files: dict[Path, str] = {}
+        self.lock = threading.Lock()
+
+    def write(self, path: Path, text: str) -> None:
+        with self.lock:
+            self.files[Path(path)] = text
+
+    def read(self, path: Path) -> str | None:
+        with self.lock:
+            return self.files.get(Path(path))
+
+    def items(self) -> list[tuple[Path, str]]:
+        with self.lock:
+            return list(self.files.items())
+
+    def flush(self) -> None:
+        # Lay out the files as `Project.initialize_modules` and `write_code` would
+        for path, text in self.items():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            (path.parent / "__init__.py").touch()
+            with open(path, "w") as f:
+                f.write(text)
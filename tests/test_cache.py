@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+from stream.cache import DiskCache
+from stream.main import get_project_structure
+from stream.project import write_code
+from stream.language.completed.python import ExecutionLimits
+from stream.language.completed.python import Project
+from stream.language.completed.python import WarmExecutor
+from stream.language.completed.python import execute_code
+
+
+def test_disk_cache_get_set(tmp_path):
+    cache = DiskCache(tmp_path)
+    key = DiskCache.key("a", "bc")
+
+    assert key != DiskCache.key("ab", "c")
+    assert cache.get(key) is None
+    cache.set(key, "value")
+    assert cache.get(key) == "value"
+    # Entries persist across instances
+    assert DiskCache(tmp_path).get(key) == "value"
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path, max_entries=10)
+    keys = [DiskCache.key(str(i)) for i in range(10)]
+    for i, key in enumerate(keys):
+        cache.set(key, str(i))
+        # Spread the access times beyond the file system resolution
+        os.utime(cache.path(key), (time.time() - 100 + i,) * 2)
+    # Touch the oldest entry, so that it becomes the most recently used one
+    assert cache.get(keys[0]) == "0"
+
+    cache.set(DiskCache.key("new"), "new")
+    assert cache.get(keys[0]) == "0"
+    assert cache.get(keys[1]) is None
+    assert cache.entries <= 10
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch) -> Project:
+    # Workers resolve modules relative to the current working directory
+    monkeypatch.chdir(tmp_path)
+    project = get_project_structure("proj", Project)
+    project.initialize_modules()
+    return project
+
+
+def test_execute_code_cache(project, tmp_path):
+    cache = DiskCache(tmp_path / "cache")
+    limits = ExecutionLimits(timeout=10.0)
+    runs = tmp_path / "runs.txt"
+    counter = f"with open({str(runs)!r}, 'a') as f:\n    f.write('x')\n"
+
+    write_code("value = 1", project.file_map["solution"])
+    write_code(counter + "from proj.solution import value", project.file_map["runtime"])
+
+    def execute() -> str:
+        return execute_code(
+            project.file_map["runtime"],
+            project=project,
+            success_message="ok",
+            executor=executor,
+            limits=limits,
+            cache=cache,
+        )
+
+    with WarmExecutor(workers=1) as executor:
+        assert execute() == "ok"
+        assert execute() == "ok"
+        assert runs.read_text() == "x"
+
+        # A changed dependency invalidates the cached outcome
+        write_code("value = 2", project.file_map["solution"])
+        assert execute() == "ok"
+        assert runs.read_text() == "xx"
+
+        # Failures are cached together with their advice
+        write_code("raise ValueError('broken')", project.file_map["solution"])
+        message = execute()
+        assert "ValueError: broken" in message
+        assert execute() == message
+        assert runs.read_text() == "xxx"
@@ -0,0 +1,95 @@
+import json
+import random
+
+from datasets import Dataset
+
+from stream.dataset import get_constraints
+from stream.dataset import get_problem
+from stream.dataset import get_problem_constraints
+from stream.dataset import get_problem_description
+from stream.dataset import get_problem_descriptions
+from stream.dataset import get_sample_indices
+
+
+def test_sample_indices_default_order():
+    random.seed(2026)
+    indices = list(range(100))
+    random.shuffle(indices)
+
+    random.seed(2026)
+    assert get_sample_indices(100) == indices
+
+
+def test_sample_indices_shards():
+    shards = []
+    for shard in range(3):
+        random.seed(2026)
+        shards.append(get_sample_indices(100, shard, 3))
+
+    assert sorted(sum(shards, [])) == list(range(100))
+    assert len(set(shards[0]) & set(shards[1])) == 0
+
+
+def test_sample_indices_limit():
+    random.seed(2026)
+    shard = get_sample_indices(100, 1, 3)
+    random.seed(2026)
+    assert get_sample_indices(100, 1, 3, limit=5) == shard[:5]
+
+
+PROBLEM = """Given an array `nums` and an integer `k`, return the k-th largest element.
+
+Example 1:
+Input: nums = [3,2,1,5,6,4], k = 2
+Output: 5
+
+Example 2:
+Input: nums = [3,2,3,1,2,4,5,5,6], k = 4
+Output: 4
+Explanation: The sorted array is [6,5,5,4,...].
+
+Constraints:
+1 <= k <= nums.length <= 10^5"""
+
+
+def test_problem_description():
+    desc, cases = get_problem_description(PROBLEM)
+
+    assert desc.startswith("Given an array") and "Example" not in desc
+    assert cases == [
+        ([[3, 2, 1, 5, 6, 4], 2], 5),
+        ([[3, 2, 3, 1, 2, 4, 5, 5, 6], 4], 4),
+    ]
+
+
+def test_problem_constraints():
+    names, constraints = get_problem_constraints(PROBLEM)
+
+    assert names == ["nums", "k"]
+    assert constraints == "1 <= k <= nums.length <= 10^5"
+
+
+def test_problem_descriptions_batch():
+    broken = PROBLEM.replace("Output: 5", "Output: five")
+    columns = get_problem_descriptions({"problem_description": [PROBLEM, broken]})
+
+    assert columns["error"] == [None, "Output evaluation failed!"]
+    assert json.loads(columns["cases"][0])[0] == [[[3, 2, 1, 5, 6, 4], 2], 5]
+    assert columns["description"][1] is None
+
+
+def test_preprocessed_problems():
+    raw = Dataset.from_dict({"problem_description": [PROBLEM, "No constraints"]})
+    preprocessed = raw.map(
+        get_problem_descriptions,
+        batched=True,
+        remove_columns=["problem_description"],
+    )
+
+    assert preprocessed["error"] == [None, "Found a sample without 'Constraints:'!"]
+    # Preprocessed rows load exactly like freshly parsed ones
+    assert get_problem(preprocessed, 0) == get_problem(raw, 0)
+    assert get_constraints(preprocessed, 0) == get_constraints(raw, 0)
+
+    random.seed(2026)
+    assert get_sample_indices(2, skip={1}) == [0]
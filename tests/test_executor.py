@@ -0,0 +1,181 @@
+import sys
+
+from pathlib import Path
+
+import pytest
+
+from stream.language.completed.python import ExecutionLimits
+from stream.language.completed.python import WarmExecutor
+from stream.language.completed.python import run_artifact
+from stream.language.completed.python import get_module_command
+from stream.language.completed.python import run_command
+from stream.store import MemoryStore
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    # Workers resolve modules relative to the current working directory
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "__init__.py").touch()
+    return tmp_path / "pkg"
+
+
+@pytest.fixture
+def limits() -> ExecutionLimits:
+    return ExecutionLimits(timeout=10.0)
+
+
+def test_warm_executor_success(package, limits):
+    (package / "ok.py").write_text("print('hello')")
+
+    with WarmExecutor(workers=1) as executor:
+        outcome = executor.run("pkg.ok", limits)
+
+    assert outcome.status == "success"
+    assert outcome.returncode == 0
+    assert outcome.stdout == "hello\n"
+    assert outcome.stderr == ""
+
+
+def test_warm_executor_failure(package, limits):
+    (package / "fail.py").write_text("raise ValueError('broken')")
+    (package / "exit.py").write_text("import sys\nsys.exit(3)")
+
+    with WarmExecutor(workers=1) as executor:
+        outcome = executor.run("pkg.fail", limits)
+        assert outcome.status == "error"
+        assert outcome.returncode == 1
+        assert "ValueError: broken" in outcome.stderr
+
+        outcome = executor.run("pkg.exit", limits)
+        assert outcome.returncode == 3
+
+
+def test_warm_executor_fresh_namespace(package, limits):
+    (package / "state.py").write_text("value = 1")
+    (package / "main.py").write_text("from pkg.state import value\nprint(value)")
+
+    with WarmExecutor(workers=1) as executor:
+        assert executor.run("pkg.main", limits).stdout == "1\n"
+
+        # Rewritten dependencies must be re-imported on the next run
+        (package / "state.py").write_text("value = 2")
+        assert executor.run("pkg.main", limits).stdout == "2\n"
+
+
+def test_warm_executor_recycles_workers(package, limits):
+    (package / "pid.py").write_text("import os\nprint(os.getpid())")
+    (package / "crash.py").write_text("import os\nos._exit(3)")
+
+    with WarmExecutor(workers=1, max_runs=2) as executor:
+        pids = [executor.run("pkg.pid", limits).stdout for _ in range(3)]
+        assert pids[0] == pids[1] != pids[2]
+
+        outcome = executor.run("pkg.crash", limits)
+        assert outcome.returncode == 3
+        assert "exited" in outcome.stderr
+        assert executor.run("pkg.pid", limits).status == "success"
+
+
+def test_warm_executor_in_memory(tmp_path, monkeypatch, limits):
+    monkeypatch.chdir(tmp_path)
+    files = {
+        "out/sample0/state.py": "value = 1",
+        "out/sample0/main.py": (
+            "from out.sample0.state import value\nprint(value)\nraise ValueError(value)"
+        ),
+    }
+
+    with WarmExecutor(workers=1) as executor:
+        outcome = executor.run("out.sample0.main", limits, files)
+        assert outcome.stdout == "1\n"
+        # Tracebacks point at the lines of the sources in memory
+        assert "raise ValueError(value)" in outcome.stderr
+
+        files["out/sample0/state.py"] = "value = 2"
+        assert executor.run("out.sample0.main", limits, files).stdout == "2\n"
+
+        # Data next to the modules is read through their loader
+        files["out/sample0/data.txt"] = "data"
+        files["out/sample0/read.py"] = (
+            "print(__loader__.get_data(__file__.removesuffix('read.py') + 'data.txt'))"
+        )
+        assert executor.run("out.sample0.read", limits, files).stdout == "b'data'\n"
+
+        # The files are only visible to the run that sent them
+        assert executor.run("out.sample0.main", limits).status == "error"
+
+    assert not (tmp_path / "out").exists()
+
+
+def test_memory_store_flush(tmp_path):
+    store = MemoryStore()
+    store.write(tmp_path / "sample0" / "main.py", "print('hello')")
+    assert store.read(tmp_path / "sample0" / "main.py") == "print('hello')"
+    assert not (tmp_path / "sample0").exists()
+
+    store.flush()
+    assert (tmp_path / "sample0" / "main.py").read_text() == "print('hello')"
+    assert (tmp_path / "sample0" / "__init__.py").exists()
+
+
+def test_run_artifact_in_memory_requires_executor(limits):
+    with pytest.raises(ValueError):
+        run_artifact(Path("out/main.py"), limits=limits, files={})
+
+
+@pytest.mark.parametrize("warm", [True, False])
+def test_limits_timeout(package, warm):
+    (package / "loop.py").write_text("while True:\n    pass")
+    limits = ExecutionLimits(timeout=0.5)
+
+    if warm:
+        with WarmExecutor(workers=1) as executor:
+            outcome = executor.run("pkg.loop", limits)
+    else:
+        outcome = run_command([sys.executable, "-m", "pkg.loop"], limits)
+
+    assert outcome.status == "timeout"
+    assert "timed out after 0.5 seconds" in outcome.describe()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Resource limits require POSIX")
+@pytest.mark.parametrize("warm", [True, False])
+def test_limits_resources(package, warm):
+    (package / "loop.py").write_text("while True:\n    pass")
+    (package / "hog.py").write_text("data = bytearray(2**31)")
+    cpu_limits = ExecutionLimits(timeout=10.0, cpu_seconds=1)
+    memory_limits = ExecutionLimits(timeout=10.0, memory_bytes=2**30)
+
+    if warm:
+        with WarmExecutor(workers=1) as executor:
+            cpu = executor.run("pkg.loop", cpu_limits)
+            memory = executor.run("pkg.hog", memory_limits)
+    else:
+        cpu = run_command(
+            get_module_command([sys.executable], "pkg.loop", cpu_limits), cpu_limits
+        )
+        memory = run_command(
+            get_module_command([sys.executable], "pkg.hog", memory_limits),
+            memory_limits,
+        )
+
+    assert cpu.status == "cpu"
+    assert memory.status == "oom"
+    assert "limit of 1024 MiB" in memory.describe()
+
+
+@pytest.mark.parametrize("warm", [True, False])
+def test_limits_output(package, warm):
+    (package / "loud.py").write_text("print('x' * 1000)")
+    limits = ExecutionLimits(timeout=10.0, max_output=10)
+
+    if warm:
+        with WarmExecutor(workers=1) as executor:
+            outcome = executor.run("pkg.loud", limits)
+    else:
+        outcome = run_command([sys.executable, "-m", "pkg.loud"], limits)
+
+    assert outcome.status == "success"
+    assert outcome.stdout == "x" * 10 + "\n[... truncated 991 characters]"
@@ -0,0 +1,489 @@
+import threading
+import time
+
+from dataclasses import asdict
+from pathlib import Path
+from types import SimpleNamespace
+
+import dspy
+import pytest
+
+from stream import feedback
+from stream.feedback import FeedbackState, ModuleWithCodeFeedback, compact_trajectory
+from stream.lm import FakeLM
+from stream.main import get_project_structure
+from stream.project import write_code
+from stream.language.completed import python
+from stream.language.completed.python import ExecutionLimits
+from stream.language.completed.python import Measurement
+from stream.language.completed.python import Outcome
+from stream.language.completed.python import Project
+from stream.language.completed.python import WarmExecutor
+from stream.language.completed.python import execute_code
+from stream.language.completed.python import measure_solution
+from stream.language.completed.python import write_cases_to_file
+from stream.language.completed.python import write_scaled_cases
+from stream.store import MemoryStore
+
+
+class Solve(dspy.Signature):
+    problem: str = dspy.InputField()
+    solution: dspy.Code["python"] = dspy.OutputField()
+    runtime: dspy.Code["python"] = dspy.OutputField()
+    memory: dspy.Code["python"] = dspy.OutputField()
+    test: dspy.Code["python"] = dspy.OutputField()
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch) -> Project:
+    # Workers resolve modules relative to the current working directory
+    monkeypatch.chdir(tmp_path)
+    project = get_project_structure("proj", Project)
+    project.initialize_modules()
+    write_cases_to_file([([1], [1])], project.file_map["cases"])
+    return project
+
+
+@pytest.fixture
+def module(project):
+    with WarmExecutor(workers=2) as executor:
+        yield ModuleWithCodeFeedback(
+            base_module=dspy.Predict(Solve),
+            project=project,
+            executor=executor,
+            limits=ExecutionLimits(timeout=10.0),
+        )
+
+
+def check(
+    module: ModuleWithCodeFeedback, state: FeedbackState | None = None, **code: str
+) -> dict[str, str]:
+    for name, value in code.items():
+        write_code(value, module.project.file_map[name])
+    outputs = dspy.Prediction(
+        **{name: dspy.Code["python"](code=value) for name, value in code.items()}
+    )
+    return module.check_outputs(outputs, list(code), state)
+
+
+def test_check_outputs_success(module):
+    advice = check(
+        module,
+        solution="def solve(x):\n    return x",
+        runtime="from proj.solution import solve\nsolve(1)",
+        memory="from proj.solution import solve\nsolve(2)",
+        test="from proj.measurements.runtime import *\nfrom proj.measurements.memory import *",
+    )
+    assert advice == {name: module.success_message for name in advice}
+    assert len(advice) == 4
+
+
+def test_check_outputs_skips_dependents(module):
+    advice = check(
+        module,
+        solution="print(0)",
+        runtime="print(1)",
+        memory="raise ValueError('broken')",
+        test="print(3)",
+    )
+    assert advice["solution"] == module.success_message
+    assert advice["runtime"] == module.success_message
+    assert "ValueError: broken" in advice["memory"]
+    assert (
+        advice["test"]
+        == "Not executed, because it is blocked by `memory`, which failed."
+    )
+
+
+def test_check_outputs_names_root_causes(module):
+    advice = check(
+        module,
+        solution="raise ValueError('broken')",
+        runtime="print(1)",
+        memory="print(2)",
+        test="print(3)",
+    )
+    assert "ValueError: broken" in advice["solution"]
+    for name in ("runtime", "memory", "test"):
+        assert (
+            advice[name]
+            == "Not executed, because it is blocked by `solution`, which failed."
+        )
+
+
+def test_check_outputs_fail_fast(module):
+    module.fail_fast = True
+    module.max_parallel = 1
+    advice = check(
+        module,
+        solution="print(0)",
+        runtime="raise ValueError('broken')",
+        memory="print(2)",
+        test="print(3)",
+    )
+    assert "ValueError: broken" in advice["runtime"]
+    assert advice["memory"] == "Not executed, because `runtime` failed first."
+    assert (
+        advice["test"]
+        == "Not executed, because it is blocked by `runtime`, which failed."
+    )
+
+
+def test_check_outputs_fail_fast_names_first_failure(module, monkeypatch):
+    class SlowEvent(threading.Event):
+        # The failing check returns well after the checks it stops
+        def set(self):
+            super().set()
+            time.sleep(0.5)
+
+    # `b` passes while `a` fails, and `c` starts after `a` stopped the checks
+    started = threading.Event()
+
+    def check_output(name: str, code: str) -> str:
+        if name == "b":
+            started.set()
+            time.sleep(0.1)
+            return module.success_message
+        started.wait()
+        return "broken"
+
+    monkeypatch.setattr(
+        feedback, "threading", SimpleNamespace(Event=SlowEvent, Lock=threading.Lock)
+    )
+    monkeypatch.setattr(module, "check_output", check_output)
+    module.project = Project(
+        files=[Project.File(Path(f"proj/{name}.py")) for name in "abc"]
+    )
+    module.fail_fast = True
+    module.max_parallel = 2
+
+    outputs = dspy.Prediction(
+        **{name: dspy.Code["python"](code="print(0)") for name in "abc"}
+    )
+    advice = module.check_outputs(outputs, ["a", "b", "c"])
+    assert advice == {
+        "a": "broken",
+        "b": module.success_message,
+        "c": "Not executed, because `a` failed first.",
+    }
+
+
+def test_check_outputs_reuses_unchanged_outcomes(module, tmp_path):
+    runs = tmp_path / "runs.txt"
+    counter = f"with open({str(runs)!r}, 'a') as f:\n    f.write('x')\n"
+    code = {
+        "solution": "def solve(x):\n    return x",
+        "runtime": counter + "from proj.solution import solve",
+        "memory": "raise ValueError('broken')",
+        "test": "print(3)",
+    }
+    state = FeedbackState()
+    state.advice = check(module, state, **code)
+    assert runs.read_text() == "x"
+
+    # Only `memory` and its dependent `test` run again
+    state.advice = check(module, state, **{**code, "memory": "print(2)"})
+    assert runs.read_text() == "x"
+    assert set(state.advice.values()) == {module.success_message}
+
+    # A changed dependency re-runs its dependents
+    state.advice = check(
+        module, state, **{**code, "solution": "def solve(x):\n    return 2 * x"}
+    )
+    assert runs.read_text() == "xx"
+
+
+def test_forward_regenerates_only_failing_outputs(project):
+    lm = FakeLM(
+        "openai/model",
+        outputs={
+            "solution": "def solve(x):\n    return x",
+            "runtime": "from proj.solution import solve\nsolve(1)",
+            "memory": "raise ValueError('broken')",
+            "test": "print(3)",
+        },
+    )
+
+    def on_step(state: FeedbackState):
+        # The LM fixes `memory`, once it got the feedback
+        lm.outputs["memory"] = "print(2)"
+
+    # Prose describes the code, so it is regenerated whenever some of the code is
+    signature = Solve.prepend("explanation", dspy.OutputField(), type_=str)
+    with WarmExecutor(workers=2) as executor:
+        module = ModuleWithCodeFeedback(
+            base_module=dspy.Predict(signature),
+            project=project,
+            executor=executor,
+            limits=ExecutionLimits(timeout=10.0),
+            on_step=on_step,
+            regenerate_failing=True,
+        )
+        with dspy.context(lm=lm, adapter=dspy.ChatAdapter()):
+            state = FeedbackState()
+            pred = module(state=state, problem="question")
+
+    assert state.step == 2 and state.success(module.success_message)
+    assert pred.solution.code == "def solve(x):\n    return x"
+    assert pred.memory.code == "print(2)"
+    # Only the failing `memory`, the skipped `test` and the explanation were requested again
+    request = lm.history[-1]["messages"][-1]["content"]
+    requested = request[request.index("Respond with the corresponding output fields") :]
+    assert "memory" in requested and "test" in requested
+    assert "explanation" in requested
+    assert "solution" not in requested and "runtime" not in requested
+    assert state.attempts["solution"] == ["def solve(x):\n    return x"]
+
+
+def test_compact_trajectory():
+    tail = "\n".join(f"print(solve({n}))" for n in range(5))
+    attempts = [f"def solve(x):\n    return x + {k}\n\n{tail}" for k in range(4)]
+    outcome = (
+        "Traceback (most recent call last):\n"
+        '  File "<frozen runpy>", line 226, in run_module\n'
+        '  File "proj/solution.py", line 2, in <module>\n'
+        "ValueError: broken"
+    )
+
+    trajectory, summary = compact_trajectory(attempts, outcome)
+    assert "<frozen runpy>" not in summary and summary.endswith("ValueError: broken")
+    assert trajectory.startswith(f"Latest attempt (4):\n{attempts[-1]}")
+    assert "-    return x + 3\n+    return x + 0" in trajectory
+    # Unchanged lines far from the edits are left out of the diffs
+    assert trajectory.count("print(solve(4))") == 1
+
+    trajectory, summary = compact_trajectory(attempts, outcome * 20, max_tokens=50)
+    assert len(trajectory) + len(summary) <= 50 * 4 + 100
+    assert "omitted" in trajectory and "omitted" in summary
+
+
+def test_modules_share_signatures(project):
+    modules = [ModuleWithCodeFeedback(dspy.Predict(Solve), project) for _ in range(2)]
+    assert modules[0].mod_signatures["self"] is modules[1].mod_signatures["self"]
+    assert "solution_attempts" in modules[0].mod_signatures["self"].input_fields
+
+
+def test_finished_on_resume(project):
+    module = ModuleWithCodeFeedback(dspy.Predict(Solve), project, steps=3)
+    success = {"solution": module.success_message}
+    assert not module.finished(FeedbackState(step=1, advice={"solution": "broken"}))
+    assert module.finished(FeedbackState(step=3, advice={"solution": "broken"}))
+    assert module.finished(FeedbackState(step=1, advice=success))
+
+    # The last step was the fastest so far, so optimizing goes on
+    module.optimize = True
+    assert not module.finished(FeedbackState(step=2, advice=success, best=1))
+    assert module.finished(FeedbackState(step=2, advice=success, best=0))
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_measure_solution(project, in_memory):
+    store = MemoryStore() if in_memory else None
+    cases = [([[3, 1, 2]], [1, 2, 3]), ([[2, 1]], [1, 2])]
+    write_cases_to_file(cases, project.file_map["cases"], store)
+    write_code(
+        "class Solution:\n    def sort(self, xs):\n        print(xs)\n        return sorted(xs)",
+        project.file_map["solution"],
+        store=store,
+    )
+
+    with WarmExecutor(workers=1) as executor:
+        limits = ExecutionLimits(timeout=10.0)
+        outcome, measurement = measure_solution(
+            project, executor=executor, limits=limits, store=store, repeats=3
+        )
+
+    assert outcome.status == "success", outcome.stderr
+    assert measurement.repeats == 3
+    # The resident memory of a warm worker includes the artifacts it ran before
+    assert measurement.max_rss_bytes is None
+    assert len(measurement.median_ns) == len(measurement.peak_bytes) == 2
+    assert all(value > 0 for value in measurement.median_ns)
+    assert "case 1" in measurement.describe()
+    assert "Runtime went from" in measurement.compare(measurement)
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_measure_solution_scaled(project, in_memory):
+    store = MemoryStore() if in_memory else None
+    write_cases_to_file([([[3, 1, 2]], [1, 2, 3])], project.file_map["cases"], store)
+    write_code(
+        "def solve(xs):\n    return sorted(xs)",
+        project.file_map["solution"],
+        store=store,
+    )
+    scaled = {size: [([list(range(size))], None)] for size in (10, 100)}
+    paths = write_scaled_cases(scaled, project.file_map["cases"], store)
+
+    with WarmExecutor(workers=1) as executor:
+        limits = ExecutionLimits(timeout=10.0)
+        outcome, measurement = measure_solution(
+            project,
+            executor=executor,
+            limits=limits,
+            store=store,
+            repeats=3,
+            scaled=paths,
+        )
+
+    assert outcome.status == "success", outcome.stderr
+    # The generated sizes are measured, instead of the examples repeated
+    assert measurement.sizes == [10, 100]
+    assert paths[10].stem == "cases_10"
+
+
+def test_execute_code_sends_only_dependencies(project, monkeypatch):
+    store = MemoryStore()
+    for name, path in project.file_map.items():
+        write_code(f"print({name!r})", path, store=store)
+    write_scaled_cases({1000: [([[1] * 1000], None)]}, project.file_map["cases"], store)
+
+    sent = {}
+
+    def run_artifact(path, executor, limits, files):
+        sent[path.stem] = set(files)
+        return Outcome("success", 0, "", "", limits)
+
+    monkeypatch.setattr(python, "run_artifact", run_artifact)
+    for name in ("solution", "runtime"):
+        execute_code(project.file_map[name], project, "ok", store=store)
+
+    assert sent["solution"] == {"proj/solution.py"}
+    # Generated cases and unrelated outputs stay out of the run
+    assert sent["runtime"] == {
+        "proj/measurements/runtime.py",
+        "proj/solution.py",
+        "proj/cases.py",
+    }
+
+
+def test_measure_solution_keeps_sizes_before_timeout(project):
+    write_cases_to_file([([[3, 1, 2]], [1, 2, 3])], project.file_map["cases"])
+    write_code(
+        "import time\n\n"
+        "def solve(xs):\n    if len(xs) > 1000:\n        time.sleep(60)\n    return sorted(xs)",
+        project.file_map["solution"],
+    )
+
+    with WarmExecutor(workers=1) as executor:
+        limits = ExecutionLimits(timeout=3.0)
+        outcome, measurement = measure_solution(
+            project, executor=executor, limits=limits, repeats=3, sizes=(10, 20, 2_000)
+        )
+
+    # Growth that the smaller sizes do not predict still times out, after saving them
+    assert outcome.status == "timeout"
+    assert measurement.sizes == [10, 20]
+
+
+def test_measure_solution_stops_before_slow_sizes(project):
+    write_cases_to_file([([[3, 1, 2, 1]], [3, 2])], project.file_map["cases"])
+    write_code(
+        "def solve(xs):\n    return [x for x in xs if xs.count(x) == 1]",
+        project.file_map["solution"],
+    )
+
+    with WarmExecutor(workers=1) as executor:
+        limits = ExecutionLimits(timeout=5.0)
+        outcome, measurement = measure_solution(
+            project, executor=executor, limits=limits, sizes=(1_000, 100_000)
+        )
+
+    # The quadratic growth from the first size predicts the second one would time out
+    assert outcome.status == "success", outcome.stderr
+    assert measurement.sizes == [1_000]
+
+
+def test_measure_solution_ambiguous(project):
+    write_code(
+        "def a(x):\n    return x\n\ndef b(x):\n    return x",
+        project.file_map["solution"],
+    )
+
+    with WarmExecutor(workers=1) as executor:
+        outcome, measurement = measure_solution(project, executor=executor)
+
+    assert measurement is None
+    assert "`a`, `b`" in outcome.stderr
+
+
+def test_improved_compares_common_sizes(project):
+    module = ModuleWithCodeFeedback(dspy.Predict(Solve), project, optimize=True)
+
+    def measured(*scaled_ns: int) -> dict:
+        sizes = [10, 100, 1000][: len(scaled_ns)]
+        return asdict(
+            Measurement(
+                [1],
+                [0],
+                [1],
+                sizes=sizes,
+                scaled_ns=list(scaled_ns),
+                scaled_bytes=[1] * len(sizes),
+            )
+        )
+
+    state = FeedbackState(
+        measurements={
+            0: measured(10, 100, 1000),
+            # Stopped before the largest size, so its last runtime looks cheaper
+            1: measured(5, 50),
+            2: measured(5, 50, 980),
+            3: measured(5, 50, 500),
+        }
+    )
+    assert module.improved(state, 0)
+    assert not module.improved(state, 1)
+    # Faster, but by less than the minimum improvement
+    assert not module.improved(state, 2)
+    assert module.improved(state, 3) and state.best == 3
+
+
+def test_forward_optimizes_while_faster(project):
+    write_cases_to_file([([[3, 1, 2, 1]], [3, 2])], project.file_map["cases"])
+    slow = "def solve(xs):\n    return [x for x in xs if xs.count(x) == 1]"
+    fast = (
+        "from collections import Counter\n\n"
+        "def solve(xs):\n    counts = Counter(xs)\n    return [x for x in xs if counts[x] == 1]"
+    )
+    lm = FakeLM(
+        "openai/model",
+        outputs={
+            "solution": slow,
+            "runtime": "print(1)",
+            "memory": "print(2)",
+            "test": "print(3)",
+        },
+    )
+
+    def on_step(state: FeedbackState):
+        # The LM finds a faster solution, then a slower one again
+        lm.outputs["solution"] = fast if state.step == 1 else slow
+
+    with WarmExecutor(workers=2) as executor:
+        module = ModuleWithCodeFeedback(
+            base_module=dspy.Predict(Solve),
+            project=project,
+            steps=5,
+            executor=executor,
+            limits=ExecutionLimits(timeout=30.0),
+            on_step=on_step,
+            measure="solution",
+            repeats=3,
+            sizes=(100, 1_000, 3_000),
+            optimize=True,
+        )
+        with dspy.context(lm=lm, adapter=dspy.ChatAdapter()):
+            state = FeedbackState()
+            pred = module(state=state, problem="question")
+
+    # The slower third attempt ends the optimization, and the faster one is kept
+    assert state.step == 3 and state.best == 1
+    assert pred.solution.code == fast
+    assert project.file_map["solution"].read_text() == fast
+    assert state.success(module.success_message)
+    request = lm.history[1]["messages"][-1]["content"]
+    assert (
+        "Improve its performance" in request and "Runtime grows as about n^" in request
+    )
+    assert state.measurements[0]["sizes"] == [100, 1_000, 3_000]
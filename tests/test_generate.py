@@ -0,0 +1,120 @@
+import pytest
+
+from stream.generate import Bounds, evaluate, generate_cases, parse_constraints
+
+
+CASES = [([[3, 2, 1, 5, 6, 4], 2], 5), ([[3, 2, 3, 1, 2, 4, 5, 5, 6], 4], 4)]
+CONSTRAINTS = """1 <= k <= nums.length <= 10^5
+-10^4 <= nums[i] <= 10^4"""
+
+
+def test_evaluate():
+    assert evaluate("10^5") == 100_000
+    assert evaluate("5 * 10^4") == 50_000
+    assert evaluate("-2^31") == -(2**31)
+    assert evaluate("2^31 - 1") == 2**31 - 1
+    assert evaluate("nums.length") is None
+
+
+def test_parse_constraints():
+    constraints = parse_constraints(
+        CONSTRAINTS
+        + "\nm == grid.length\n1 <= m, n < 200\ns consists of lowercase English letters.",
+        ["nums", "k", "grid", "s"],
+    )
+
+    assert constraints.get(("nums", 0, "length")) == Bounds(
+        lo=None, hi=100_000, hi_ref=None
+    )
+    assert constraints.get(("nums", 1, "value")) == Bounds(lo=-10_000, hi=10_000)
+    assert constraints.get(("k", 0, "value")) == Bounds(
+        lo=1, hi_ref=("nums", 0, "length")
+    )
+    # Aliases share their bounds, and strict bounds exclude the limit
+    assert constraints.get(("grid", 0, "length")) == Bounds(lo=1, hi=199)
+    assert constraints.charsets["s"] == "abcdefghijklmnopqrstuvwxyz"
+
+
+def test_generate_cases_sequences():
+    generated = generate_cases(CASES, ["nums", "k"], CONSTRAINTS, (10, 1_000, 10**6))
+
+    # Sizes beyond the stated length are clipped to it
+    assert list(generated) == [10, 1_000, 100_000]
+    (nums, k), output = generated[1_000][0]
+    assert output is None
+    assert len(nums) == 1_000 and all(-10_000 <= x <= 10_000 for x in nums)
+    assert 1 <= k <= len(nums)
+    # The same seed generates the same inputs
+    assert generate_cases(CASES, ["nums", "k"], CONSTRAINTS, (1_000,)) == {
+        1_000: generated[1_000]
+    }
+
+
+def test_generate_cases_shapes():
+    grid = generate_cases(
+        [([[[1, 0], [0, 1]]], 2)],
+        ["grid"],
+        "m == grid.length\nn == grid[i].length\n1 <= m, n <= 200\ngrid[i][j] is 0 or 1",
+        (10_000, 10**6),
+    )
+    # Matrices grow in both dimensions, up to the number of cells they can have
+    assert list(grid) == [10_000, 40_000]
+    (rows,), _ = grid[10_000][0]
+    assert len(rows) == 100 and {len(row) for row in rows} == {100}
+    assert {x for row in rows for x in row} <= {0, 1}
+
+    intervals = generate_cases(
+        [([[[1, 3], [2, 6], [8, 10]]], [[1, 6], [8, 10]])],
+        ["intervals"],
+        "1 <= intervals.length <= 10^4\nintervals[i].length == 2\n"
+        "0 <= starti <= endi <= 10^4",
+        (1_000,),
+    )
+    (pairs,), _ = intervals[1_000][0]
+    assert len(pairs) == 1_000 and {len(pair) for pair in pairs} == {2}
+    # Rows keep the order of the examples, as in `starti <= endi`
+    assert all(start <= end for start, end in pairs)
+
+    words = generate_cases(
+        [([["eat", "tea", "tan"]], [["eat", "tea"], ["tan"]])],
+        ["strs"],
+        "1 <= strs.length <= 10^4\nstrs[i] consists of lowercase English letters.",
+        (100,),
+    )
+    (strs,), _ = words[100][0]
+    assert len(strs) == 100 and all(
+        s.isalpha() and s.islower() and len(s) == 3 for s in strs
+    )
+
+
+def test_generate_cases_scalars():
+    # A scalar without sequences is the size of the problem
+    generated = generate_cases([([3], 3)], ["n"], "1 <= n <= 45", (10, 1_000))
+    assert generated == {10: [([10], None)], 45: [([45], None)]}
+
+    # Sorted and unique sequences, as the constraints state
+    generated = generate_cases(
+        [([[-1, 0, 3, 5, 9, 12], 9], 4)],
+        ["nums", "target"],
+        "1 <= nums.length <= 10^4\n-10^4 < nums[i], target < 10^4\n"
+        "All the integers in nums are unique.\nnums is sorted in ascending order.",
+        (1_000,),
+    )
+    (nums, target), _ = generated[1_000][0]
+    assert nums == sorted(set(nums)) and len(nums) == 1_000
+    assert target == 9
+
+
+def test_generate_cases_without_examples():
+    assert generate_cases([], ["nums"], CONSTRAINTS, (1_000,)) == {}
+
+
+def test_generate_cases_unsatisfiable():
+    # The length bounds `k` from above, below its own lower bound
+    with pytest.raises(ValueError):
+        generate_cases(
+            [([[1, 2, 3], 5], 0)],
+            ["nums", "k"],
+            "1 <= nums.length <= 3\n5 <= k <= nums.length",
+            (1_000,),
+        )
@@ -0,0 +1,25 @@
+from collections import defaultdict
+
+from stream.feedback import FeedbackState
+from stream.journal import Journal
+
+
+def test_journal_resumes_from_last_step(tmp_path):
+    journal = Journal(tmp_path / "journal.jsonl")
+    assert journal.load() == {}
+
+    state = FeedbackState(step=1, advice={"solution": "broken"})
+    state.attempts["solution"].append("print(0)")
+    journal.step(3, state, seconds=1.0)
+    journal.step(5, FeedbackState(step=1, advice={"solution": "ok"}), seconds=1.0)
+    journal.done(5, FeedbackState(step=1), success=True, seconds=2.0)
+    # A write interrupted by a crash
+    with open(journal.path, "a") as f:
+        f.write('{"sample": 3, "event": "st')
+
+    progress = Journal(journal.path).load()
+    assert not progress[3].done
+    assert progress[3].state == state
+    assert isinstance(progress[3].state.attempts, defaultdict)
+    assert progress[5].done
+    assert progress[5].state.advice == {"solution": "ok"}
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import dspy
+import pytest
+from litellm import ModelResponse, RateLimitError
+
+from stream.cache import DiskCache
+from stream.lm import CachedLM, FakeLM
+
+
+@pytest.fixture
+def calls(monkeypatch) -> list[list[dict]]:
+    # Stand in for the provider, recording every request that reaches it
+    calls = []
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        calls.append(messages)
+        time.sleep(0.1)
+        return ModelResponse(
+            model=self.model,
+            choices=[
+                {"index": 0, "message": {"role": "assistant", "content": "answer"}}
+            ],
+            usage={"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        )
+
+    monkeypatch.setattr(dspy.LM, "forward", forward)
+    return calls
+
+
+def make_lm(tmp_path, **kwargs) -> CachedLM:
+    return CachedLM("openai/model", DiskCache(tmp_path), temperature=1.0, **kwargs)
+
+
+MESSAGES = [{"role": "user", "content": "question"}]
+
+
+def test_cached_lm_serves_repeated_requests(tmp_path, calls):
+    assert make_lm(tmp_path, api_key="a")(messages=MESSAGES) == ["answer"]
+    # Another process with other credentials re-uses the response
+    assert make_lm(tmp_path, api_key="b")(messages=MESSAGES) == ["answer"]
+    assert len(calls) == 1
+
+    # Different sampling parameters are different requests
+    make_lm(tmp_path)(messages=MESSAGES, temperature=0.5)
+    assert len(calls) == 2
+
+
+def test_cached_lm_replay(tmp_path, calls):
+    make_lm(tmp_path)(messages=MESSAGES)
+
+    replay = make_lm(tmp_path, replay=True)
+    assert replay(messages=MESSAGES) == ["answer"]
+    with pytest.raises(LookupError):
+        replay(messages=[{"role": "user", "content": "another question"}])
+    assert len(calls) == 1
+
+
+def test_cached_lm_deduplicates_in_flight_requests(tmp_path, calls):
+    lm = make_lm(tmp_path)
+    threads = [
+        threading.Thread(target=lm, kwargs={"messages": MESSAGES}) for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(lm.history) == 4
+
+
+class Solve(dspy.Signature):
+    problem: str = dspy.InputField()
+    explanation: str = dspy.OutputField()
+    solution: dspy.Code["python"] = dspy.OutputField()
+
+
+def test_fake_lm_scripted_outputs(tmp_path):
+    lm = FakeLM("openai/model", outputs={"solution": ["x = 1", "x = 2"]}, seed=0)
+    with dspy.context(lm=lm, adapter=dspy.ChatAdapter()):
+        pred = dspy.Predict(Solve)(problem="question")
+
+    assert pred.explanation == "pass"
+    assert pred.solution.code in ("x = 1", "x = 2")
+
+
+def test_fake_lm_failures_and_recordings(tmp_path, calls):
+    with pytest.raises(RateLimitError):
+        FakeLM("openai/model", error_rate=1.0)(messages=MESSAGES)
+
+    # Requests recorded by a cached LM are served as recorded
+    make_lm(tmp_path)(messages=MESSAGES)
+    fake = FakeLM("openai/model", recorded=DiskCache(tmp_path), temperature=1.0)
+    assert fake(messages=MESSAGES) == ["answer"]
+    assert len(calls) == 1
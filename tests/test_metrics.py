@@ -0,0 +1,37 @@
+import json
+import threading
+
+from stream.metrics import Metrics
+
+
+def test_metrics_records_tags_and_summarizes(tmp_path):
+    metrics = Metrics(enabled=True)
+
+    def solve(sample: int):
+        with metrics.tags(sample=sample):
+            for step in range(2):
+                with metrics.tags(step=step), metrics.span("generate"):
+                    metrics.count("failures", 1 - step)
+
+    threads = [threading.Thread(target=solve, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    metrics.dump(tmp_path / "metrics.jsonl")
+    records = [json.loads(line) for line in open(tmp_path / "metrics.jsonl")]
+    assert len(records) == 12
+    assert {(r["sample"], r["step"]) for r in records} == {
+        (i, j) for i in range(3) for j in range(2)
+    }
+
+    lines = metrics.summary(by=("step",)).splitlines()
+    assert lines[0].split()[:3] == ["name", "kind", "step"]
+    assert len(lines) == 5
+
+    # Nothing is recorded until enabled
+    disabled = Metrics()
+    with disabled.span("generate"):
+        disabled.count("failures")
+    assert disabled.records == []
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from litellm import RateLimitError
+
+from stream.scheduler import Scheduler
+
+
+def flaky(failures: int):
+    # Fails with a rate limit the first few times it is called
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) <= failures:
+            raise RateLimitError("429", llm_provider="fake", model="model")
+        return "response"
+
+    return fn, calls
+
+
+def test_scheduler_retries_transient_failures():
+    scheduler = Scheduler(max_retries=2, backoff=0.01)
+    fn, calls = flaky(2)
+    assert scheduler.call(fn, tokens=1) == "response"
+    assert len(calls) == 3
+
+    fn, calls = flaky(3)
+    with pytest.raises(RateLimitError):
+        scheduler.call(fn, tokens=1)
+
+    # Other errors are not retried
+    with pytest.raises(ValueError):
+        scheduler.call(lambda: int("x"), tokens=1)
+
+
+def test_scheduler_budgets(monkeypatch):
+    # Shorten the budget window, instead of waiting for a minute
+    monkeypatch.setattr("stream.scheduler.WINDOW", 0.2)
+    scheduler = Scheduler(rpm=2)
+    start = time.monotonic()
+    for _ in range(3):
+        scheduler.call(lambda: None, tokens=1)
+    assert time.monotonic() - start >= 0.2
+
+    scheduler = Scheduler(tpm=100)
+    assert scheduler.reserve(60)[1] is not None
+    wait, entry = scheduler.reserve(60)
+    assert entry is None and 0 < wait <= 0.2
+
+
+def test_scheduler_max_in_flight():
+    scheduler = Scheduler(max_in_flight=2)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fn():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+
+    threads = [
+        threading.Thread(target=scheduler.call, args=(fn,), kwargs={"tokens": 1})
+        for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+
+
+def test_scheduler_async():
+    scheduler = Scheduler(max_in_flight=1, backoff=0.01)
+    fn, calls = flaky(1)
+
+    async def afn():
+        return fn()
+
+    async def run():
+        return await asyncio.gather(*(scheduler.acall(afn, tokens=1) for _ in range(3)))
+
+    assert asyncio.run(run()) == ["response"] * 3
+    assert len(calls) == 4
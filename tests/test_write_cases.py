@@ -1,7 +1,15 @@
+import importlib
 import pytest
 import subprocess
+import sys
 
+from pathlib import Path
+
+from stream.language.completed.python import ExecutionLimits
+from stream.language.completed.python import WarmExecutor
+from stream.language.completed.python import get_files
 from stream.language.completed.python import write_cases_to_file
+from stream.store import MemoryStore
 
 
 TEST_CASES = [
@@ -29,3 +37,29 @@ def test_write_cases_to_file(array, label, tmp_path):
     # Check successful execution
     result = subprocess.run(f"uv run {str(test_file)}")
     assert result.returncode == 0
+
+
+@pytest.mark.parametrize("cases_format", ["literal", "json"])
+def test_write_cases_formats(cases_format, tmp_path, monkeypatch):
+    array = TEST_CASES[0][0]
+    write_cases_to_file(array, tmp_path / "cases.py", cases_format=cases_format)
+
+    monkeypatch.syspath_prepend(tmp_path)
+    monkeypatch.delitem(sys.modules, "cases", raising=False)
+    # Both formats load the same cases, up to tuples within the inputs
+    assert importlib.import_module("cases").cases == array
+    assert (tmp_path / "cases.json").exists() == (cases_format == "json")
+
+
+def test_write_cases_json_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = MemoryStore()
+    write_cases_to_file(TEST_CASES[0][0], Path("proj/cases.py"), store, "json")
+    store.write(Path("proj/main.py"), "from proj.cases import cases\nprint(len(cases))")
+
+    with WarmExecutor(workers=1) as executor:
+        files = get_files(store, [Path("proj/main.py"), Path("proj/cases.py")])
+        outcome = executor.run("proj.main", ExecutionLimits(timeout=10.0), files)
+
+    assert outcome.stdout == "4\n", outcome.stderr
+    assert set(files) == {"proj/main.py", "proj/cases.py", "proj/cases.json"}